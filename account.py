@@ -4,10 +4,18 @@
 
 from Crypto.PublicKey import ECC
 from Crypto.PublicKey.ECC import import_key
+from Crypto.Hash import SHA256
+from Crypto.Signature import DSS
 from util import bytes_to_long, long_to_bytes
+from ixan import derive_ixan, get_registry
 import os
 import random
-import itertools
+import hashlib
+import threading
+
+# Signature schemes, recorded with every transaction as 'sig_version'
+SIG_LEGACY = 1 # Raw ECC._sign over the whole message read as one integer
+SIG_DIGEST = 2 # DSS (FIPS 186-3) over a SHA-256 digest of the message, hex encoded
 
 class Account():
     def __init__(self, passphrase, account_name="default"):
@@ -15,6 +23,9 @@ class Account():
         self.private_key = None
         self.passphrase = passphrase
         self.account_name = account_name
+        # Derived once per handle (exporting the PEM and reading ixan.txt are not free)
+        self._identity = None
+        self._ixan = None
         keydict = self.create_keys()
 
     def create_keys(self):
@@ -84,53 +95,115 @@ class Account():
         verification = self.private_key._verify(bytes_to_long(M), S)
         return verification
     
+    def sign_digest(self, M):
+        # Fixed-size digest, so the cost does not grow with the message
+        h = SHA256.new(M.encode())
+        return DSS.new(self.private_key, 'fips-186-3').sign(h).hex()
+
+    def verify_digest(self, M, S):
+        return verify_digest(self.public_key, M, S)
+
     def identity(self):
+        if self._identity is not None:
+            return self._identity
         address = self.public_key._export_public_pem(self.passphrase)
         address1 =  str(address).replace('-----BEGIN PUBLIC KEY-----', '')
         address2 =  str(address1).replace('-----END PUBLIC KEY-----', '')
+        self._identity = address2
         return address2
 
     def ixan(self):
         """ 
        Generate an International XBucks Account Number
         """
-        file = './keys/ixan.txt'
+        if self._ixan is not None:
+            return self._ixan
+        # Each account keeps its own IXAN file, next to its keys
+        if self.account_name == "default":
+            file = './keys/ixan.txt'
+        else:
+            file = f'./keys/{self.account_name}_ixan.txt'
         try:
             ixan_file = open(file, 'r')
             
             ixan = ixan_file.read();#
+            ixan_file.close()
         except FileNotFoundError:
-            max_length = 12
-            ixan = ''
-            identity = self.identity()
-            # Clean whitespace
-            identity = identity.replace('\n', '')
-            # Find numbers
-            for i in identity:
-                if i.isdigit() == True:
-                    ixan += i
-                else:
-                    pass
-            # Edit IXAN to be 11 digits
-            n = len(ixan)
-            if n < max_length:
-                char = (max_length - n)
-                i = itertools.product(str('1234567890'), repeat=char)
-                entry = []
-                for r in i:
-                    entry.append(r)
-                length = len(entry)
-                r = random.randint(0, length)
-                end_number = ''.join(entry[r])
-                ixan = ixan+end_number
-            # Create the file
-            ixan_dir = open(file, 'x')
-            ixan_dir.close()
+            # Derived from the public key, so no enumeration of padding digits
+            ixan = derive_ixan(self.identity())
             # Write to file
-            ixan_buffer = open(file, 'w')
+            ixan_buffer = open(file, 'x')
             ixan_buffer.write(ixan)
             ixan_buffer.close()
+        # Index it so the IXAN can be resolved back to this identity (raises on collision)
+        get_registry().register(ixan, self.identity())
+        self._ixan = ixan
         return ixan
 
+
+def verify_digest(public_key, M, S):
+    # Check a SIG_DIGEST signature against a public key
+    try:
+        DSS.new(public_key, 'fips-186-3').verify(SHA256.new(M.encode()), bytes.fromhex(S))
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def verify_signature(public_key, M, S, version=SIG_LEGACY):
+    # Check a signature made with any of the supported schemes
+    if version == SIG_DIGEST:
+        return verify_digest(public_key, M, S)
+    if version == SIG_LEGACY:
+        try:
+            return public_key._verify(bytes_to_long(M.encode()), S)
+        except Exception:
+            return False
+    return False
+
+
+def public_key_from_identity(identity):
+    # Inverse of Account.identity(): put the PEM armour back and import the key
+    return import_key('-----BEGIN PUBLIC KEY-----' + identity + '-----END PUBLIC KEY-----')
+
+
+class Keyring():
+    """
+    In-process cache of unlocked accounts.
+    Each (account name, passphrase) pair is decrypted from ./keys once and the
+    same Account handle is shared by every caller afterwards, together with
+    its cached identity and IXAN.
+    """
+    def __init__(self):
+        self._accounts = {}
+        self._lock = threading.Lock()
+
+    def _key(self, passphrase, account_name):
+        # Never keep the passphrase itself as a dict key
+        return (account_name, hashlib.sha256(passphrase.encode()).hexdigest())
+
+    def get(self, passphrase, account_name="default"):
+        key = self._key(passphrase, account_name)
+        with self._lock:
+            account = self._accounts.get(key)
+            if account is None:
+                # A wrong passphrase raises here and nothing is cached
+                account = Account(passphrase, account_name=account_name)
+                self._accounts[key] = account
+            return account
+
+    def forget(self, account_name=None):
+        # Drop one account (all passphrases) or every cached account
+        with self._lock:
+            if account_name is None:
+                self._accounts.clear()
+            else:
+                for key in [k for k in self._accounts if k[0] == account_name]:
+                    del self._accounts[key]
+
+
+# Shared keyring for the process
+keyring = Keyring()
+
 # Remaining work:
 # 2. Be able to spend money with the account (Need for a transaction account)
@@ -44,7 +44,7 @@ class AccountManager():
 
     def get_balance(self, cns):
         cursor = self.db.cursor()
-        res = cursor.execute('SELECT balance FROM currency WHERE currency_symbol="'+cns+'"')
+        res = cursor.execute('SELECT balance FROM currency WHERE currency_symbol=?', (cns,))
         return res.fetchone()
     
     def get_snapshot(self):
@@ -67,7 +67,7 @@ class AccountManager():
     def update_balance(self, currency, amount):
         # I create this so that accounts can be invoked
         cursor = self.db.cursor()
-        cursor.execute("UPDATE currency SET balance = balance+"+str(amount)+" WHERE currency_symbol = '"+currency+"'")
+        cursor.execute("UPDATE currency SET balance = balance+? WHERE currency_symbol = ?", (amount, currency))
 
     def connect(self):
         # Connect to wallet for transfer of funds and viewing balance
@@ -0,0 +1,315 @@
+# Copyright (c) 2025 Nikola Tesla
+# Asyncio node server
+# Serves the same NodeRPCHandler methods as node.ThreadedXMLRPCServer, over XML-RPC on HTTP/1.1,
+# from one event loop instead of one OS thread per connection.
+# - At most max_connections sockets are served at once; extra ones are closed straight away
+# - At most max_concurrency handler calls run at once; the rest wait their turn
+# - Every read and write has a timeout, so slow or idle clients cannot pin a connection
+# - Handler methods (signature checks, SQLite, block validation) run in a thread pool executor
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import loads, dumps, Fault
+from xmlrpc.server import resolve_dotted_attribute
+
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+MAX_HEADER_LINES = 100
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 408: "Request Timeout",
+           411: "Length Required", 413: "Payload Too Large", 501: "Not Implemented"}
+
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class AsyncXMLRPCServer:
+    def __init__(self, instance, host, port, max_concurrency=64, max_connections=1024,
+                 request_timeout=10.0, idle_timeout=30.0, workers=16, rpc_paths=("/",)):
+        self.instance = instance
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout # Seconds to receive a whole request once it has started
+        self.idle_timeout = idle_timeout # Seconds a keep-alive connection may sit between requests
+        self.rpc_paths = rpc_paths
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rpc")
+        self.connections = 0
+        self.on_bytes = None # on_bytes(direction, n) for every request ("in") / response ("out") body
+        self.loop = None
+        self._server = None
+        self._semaphore = None
+        self._tasks = set() # One task per open connection
+        self._stopped = None
+        self._ready = threading.Event()
+        self._error = None # Why serving stopped before it was ready (e.g. the port is taken)
+        self._thread = None
+
+    # --- Request handling ---
+    def _dispatch(self, body):
+        response = self._call(body)
+        if self.on_bytes is not None:
+            self.on_bytes("in", len(body))
+            self.on_bytes("out", len(response))
+        return response
+
+    def _call(self, body):
+        # Runs in the executor: decode, call, encode, exactly like SimpleXMLRPCDispatcher
+        try:
+            params, method = loads(body, use_builtin_types=True)
+            try:
+                func = resolve_dotted_attribute(self.instance, method, False)
+            except AttributeError:
+                raise Fault(1, f'method "{method}" is not supported')
+            if not callable(func):
+                raise Fault(1, f'method "{method}" is not supported')
+            return dumps((func(*params),), methodresponse=True, allow_none=True)
+        except Fault as fault:
+            return dumps(fault, allow_none=True)
+        except Exception as e:
+            return dumps(Fault(1, f"{type(e)}:{e}"), allow_none=True)
+
+    async def _read_request(self, reader, wait):
+        # -> (path, keep_alive, body), or None if the client closed the connection between requests
+        try:
+            # Wait up to `wait` for the first byte of the request, then the rest on the request timeout
+            first = await asyncio.wait_for(reader.read(1), wait)
+            if not first:
+                return None
+            deadline = time.monotonic() + self.request_timeout
+            head = first + await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.request_timeout)
+        except asyncio.LimitOverrunError:
+            raise _HTTPError(400)
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        if len(parts) != 3 or len(lines) > MAX_HEADER_LINES:
+            raise _HTTPError(400)
+        command, path, version = parts
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if command != "POST":
+            raise _HTTPError(501)
+        if path not in self.rpc_paths:
+            raise _HTTPError(404)
+        if "content-length" not in headers:
+            raise _HTTPError(411)
+        length = int(headers["content-length"])
+        if length > MAX_REQUEST_BYTES:
+            raise _HTTPError(413)
+        body = await asyncio.wait_for(reader.readexactly(length), max(deadline - time.monotonic(), 0.001))
+        return path, keep_alive, body
+
+    async def _respond(self, writer, status, body=b"", keep_alive=False):
+        head = [f"HTTP/1.1 {status} {REASONS[status]}", "Server: XBucksAsyncRPC",
+                f"Content-Length: {len(body)}", "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if body:
+            head.append("Content-Type: text/xml")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await asyncio.wait_for(writer.drain(), self.request_timeout)
+
+    async def _handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.close()
+            return
+        self.connections += 1
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            # A new connection must start its request promptly; between requests it may idle longer
+            wait = self.request_timeout
+            while True:
+                try:
+                    request = await self._read_request(reader, wait)
+                except _HTTPError as e:
+                    await self._respond(writer, e.status)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self._respond(writer, 400)
+                    break
+                if request is None:
+                    break
+                _, keep_alive, body = request
+                async with self._semaphore:
+                    response = await self.loop.run_in_executor(self.executor, self._dispatch, body)
+                await self._respond(writer, 200, response.encode("utf-8"), keep_alive)
+                if not keep_alive:
+                    break
+                wait = self.idle_timeout
+        except (asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            self._tasks.discard(task)
+            writer.close()
+
+    # --- Lifecycle ---
+    async def _serve(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  backlog=min(self.max_connections, 4096))
+        self._stopped = asyncio.Event()
+        self._ready.set()
+        # start_server is already accepting; run until _stop has closed everything
+        await self._stopped.wait()
+
+    def serve_forever(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as e:
+            if not self._ready.is_set():
+                self._error = e
+            raise
+        finally:
+            self._ready.set()
+            self.loop.close()
+
+    def start(self):
+        """Serve from a background thread; returns once the socket is listening.
+        Raises what stopped the server from starting (OSError for a port in use), like the threaded server."""
+        self._thread = threading.Thread(target=self._serve_thread, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        return self._thread
+
+    def _serve_thread(self):
+        try:
+            self.serve_forever()
+        except Exception:
+            # Already reported to start() through _error
+            pass
+
+    async def _stop(self):
+        # Stop accepting, then drop the connections still open (idle keep-alives included)
+        self._server.close()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._stopped.set()
+
+    def shutdown(self):
+        if self.loop is not None and self._server is not None and not self.loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(timeout=5)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+
+# ----------------------------
+# Load test: threaded vs asyncio server
+# ----------------------------
+async def _client(host, port, body, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"POST / HTTP/1.1\r\nHost: {host}\r\nContent-Type: text/xml\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("server closed the connection")
+                if line in (b"\r\n", b"\n"):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def _load(host, port, body, clients, per_client, idle):
+    # idle connections are opened first and never send anything, like a port scan
+    idle_writers = []
+    for _ in range(idle):
+        try:
+            idle_writers.append((await asyncio.open_connection(host, port))[1])
+        except OSError:
+            break
+    start = time.perf_counter()
+    latencies = []
+    results = await asyncio.gather(*(_client(host, port, body, per_client, latencies) for _ in range(clients)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    for writer in idle_writers:
+        writer.close()
+    return latencies, sum(isinstance(r, Exception) for r in results), elapsed
+
+
+def _run_load(host, port, body, clients, per_client, idle):
+    # Runs in a separate process so the load generator does not share the servers' GIL
+    return asyncio.run(_load(host, port, body, clients, per_client, idle))
+
+
+def benchmark(clients=(10, 100, 500), per_client=40, idle=(0, 1000), threaded_port=9951, async_port=9952):
+    """
+    Signed ping round trips from many concurrent keep-alive clients, with and without a
+    crowd of idle connections; prints req/s, p99 latency and the peak thread count.
+    """
+    import node
+    from concurrent.futures import ProcessPoolExecutor
+    secret = "bench"
+    handler = node.NodeRPCHandler("127.0.0.1", 0, node.PeerDB(), secret)
+
+    class RequestHandler(node.SimpleXMLRPCRequestHandler):
+        rpc_paths = ("/",)
+        protocol_version = "HTTP/1.1"
+        timeout = 30
+
+    class Server(node.ThreadedXMLRPCServer):
+        request_queue_size = 4096 # Same listen backlog as the asyncio server, set before bind
+
+    threaded = Server(("127.0.0.1", threaded_port), requestHandler=RequestHandler, allow_none=True, logRequests=False)
+    threaded.register_instance(handler)
+    threading.Thread(target=threaded.serve_forever, daemon=True).start()
+    # Room for the idle crowd plus the clients, as the threaded server has no cap
+    async_server = AsyncXMLRPCServer(handler, "127.0.0.1", async_port, max_connections=4096)
+    async_server.start()
+
+    load = ProcessPoolExecutor(max_workers=1)
+    try:
+        for n_idle in idle:
+            for n in clients:
+                for name, port in (("threaded", threaded_port), ("asyncio", async_port)):
+                    timestamp, nonce, signature = node.signed_args(secret)
+                    body = dumps((timestamp, nonce, signature), "ping").encode("utf-8")
+                    future = load.submit(_run_load, "127.0.0.1", port, body, n, per_client, n_idle)
+                    peak_threads = threading.active_count()
+                    while not future.done():
+                        peak_threads = max(peak_threads, threading.active_count())
+                        time.sleep(0.01)
+                    latencies, failed, elapsed = future.result()
+                    latencies.sort()
+                    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan")
+                    print(f"{name:8} idle={n_idle:4} clients={n:4}  {len(latencies) / elapsed:8.0f} req/s"
+                          f"  p99 {p99:7.1f} ms  failed {failed:3}  peak threads {peak_threads}")
+    finally:
+        load.shutdown()
+        threaded.shutdown()
+        threaded.server_close()
+        async_server.shutdown()
+
+
+if __name__ == "__main__":
+    benchmark()
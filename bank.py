@@ -2,6 +2,7 @@
 # Copyright (c) 2025 Nikola Tesla
 # Decentralized Banking & DEX Module
 
+import math
 import time
 import json
 import random
@@ -9,6 +10,8 @@ import sqlite3
 import hashlib
 from accountmanager import AccountManager
 from transaction import Transaction
+from savings import ensure_savings_schema
+from quotecache import quote_cache
 
 class Bank:
     def __init__(self, account_manager):
@@ -23,6 +26,7 @@ class Bank:
             balance REAL, 
             interest_rate REAL, 
             locked_until REAL)""")
+        ensure_savings_schema(self.cursor)
         
         # Ensure USDT wallet tracking (if separate from main currency table)
         # We use the main 'currency' table for USDT balance, but 'addresses' table for external wallet addresses.
@@ -64,58 +68,140 @@ class Bank:
         return True
 
     def withdraw(self, amount, currency, target_account):
-        # Check balance
-        bal = self.am.get_balance(currency)
-        current_bal = float(bal[0]) if bal else 0.0
-        
-        if current_bal < amount:
+        # Check balance and debit in one statement
+        if not self._debit(currency, amount):
             raise ValueError("Insufficient funds")
-            
-        # Debit
-        self.am.update_balance(currency, -amount)
+        self.db.commit()
         print(f"Withdrew {amount} {currency} to {target_account}.")
         return True
 
+    def _debit(self, currency, amount):
+        # Conditional debit: only touches the row if the balance covers the amount
+        # balance is stored untyped ('0'), so cast before comparing against a number
+        self.cursor.execute(
+            "UPDATE currency SET balance = balance - ? WHERE currency_symbol = ? AND CAST(balance AS REAL) >= ?",
+            (amount, currency, amount))
+        return self.cursor.rowcount == 1
+
+    def _credit(self, currency, amount):
+        self.cursor.execute("UPDATE currency SET balance = balance + ? WHERE currency_symbol = ?", (amount, currency))
+
+    # Keys every bulk operation type needs
+    BULK_KEYS = {
+        'deposit': ('amount', 'currency'),
+        'withdraw': ('amount', 'currency'),
+        'convert': ('amount', 'from', 'to'),
+    }
+
+    def bulk_operations(self, operations):
+        """
+        Apply a batch of deposits, withdrawals and conversions in a single transaction.
+        Each operation is a dict with a 'type' of 'deposit', 'withdraw' or 'convert':
+            {'type': 'deposit', 'amount': 500, 'currency': 'NGN'}
+            {'type': 'withdraw', 'amount': 200, 'currency': 'NGN', 'target': 'ACC-1'}
+            {'type': 'convert', 'amount': 1000, 'from': 'NGN', 'to': 'USDT'}
+        Operations are applied in order. If any of them fails (unknown type, bad amount,
+        insufficient funds, missing keys) the whole batch is rolled back and a ValueError is raised.
+        Returns a list with the balance change of every operation: the amount credited for
+        deposits and conversions, the negative amount for withdrawals.
+        """
+        for i, op in enumerate(operations):
+            if not isinstance(op, dict):
+                raise ValueError(f"Operation {i}: expected a dict")
+            if op.get('type') not in self.BULK_KEYS:
+                raise ValueError(f"Operation {i}: unknown type {op.get('type')!r}")
+            missing = [key for key in self.BULK_KEYS[op['type']] if key not in op]
+            if missing:
+                raise ValueError(f"Operation {i}: missing {', '.join(missing)}")
+        results = []
+        rates = {} # One DEX quote per pair for the whole batch
+        try:
+            for i, op in enumerate(operations):
+                kind = op['type']
+                try:
+                    amount = float(op['amount'])
+                except (TypeError, ValueError):
+                    raise ValueError(f"Operation {i}: amount must be a number")
+                if not (math.isfinite(amount) and amount > 0):
+                    raise ValueError(f"Operation {i}: amount must be a positive finite number")
+
+                if kind == 'deposit':
+                    self._ensure_currency(op['currency'], commit=False)
+                    self._credit(op['currency'], amount)
+                    results.append(amount)
+                elif kind == 'withdraw':
+                    if not self._debit(op['currency'], amount):
+                        raise ValueError(f"Operation {i}: insufficient {op['currency']} funds")
+                    results.append(-amount)
+                elif kind == 'convert':
+                    pair = (op['from'], op['to'])
+                    if pair not in rates:
+                        rates[pair] = DEX.get_rate(*pair)
+                    if rates[pair] == 0.0:
+                        raise ValueError(f"Operation {i}: no liquidity pair for {pair[0]}/{pair[1]}")
+                    if not self._debit(pair[0], amount):
+                        raise ValueError(f"Operation {i}: insufficient {pair[0]} funds")
+                    received = amount * rates[pair]
+                    self._ensure_currency(pair[1], commit=False)
+                    self._credit(pair[1], received)
+                    results.append(received)
+                else:
+                    raise ValueError(f"Operation {i}: unknown type {kind!r}")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        print(f"Bulk operations: applied {len(results)} operations.")
+        return results
+
     def convert_fiat_to_usdt(self, fiat_currency, fiat_amount):
         # 1. Get Rate
         rate = DEX.get_rate(fiat_currency, "USDT")
         usdt_amount = fiat_amount * rate
         
-        # 2. Debit Fiat
-        self.withdraw(fiat_amount, fiat_currency, "INTERNAL_CONVERSION")
-        
-        # 3. Credit USDT
-        # Ensure USDT exists in currency table (AccountManager might need 'add_currency' logic if dynamic? 
-        # But 'update_balance' usually fails if row missing. AccountManager Init creates NGN,USD,ZAR.)
-        # We need to ensure USDT row exists.
-        self._ensure_currency("USDT")
-        self.am.update_balance("USDT", usdt_amount)
+        # 2. Debit Fiat and 3. Credit USDT in one transaction, so a failure in between loses nothing
+        try:
+            if not self._debit(fiat_currency, fiat_amount):
+                raise ValueError("Insufficient funds")
+            # Ensure USDT exists in currency table (AccountManager might need 'add_currency' logic if dynamic? 
+            # But 'update_balance' usually fails if row missing. AccountManager Init creates NGN,USD,ZAR.)
+            # We need to ensure USDT row exists.
+            self._ensure_currency("USDT", commit=False)
+            self.am.update_balance("USDT", usdt_amount)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         
         print(f"Converted {fiat_amount} {fiat_currency} -> {usdt_amount} USDT")
         return usdt_amount
 
-    def _ensure_currency(self, symbol):
+    def _ensure_currency(self, symbol, commit=True):
         # Internal helper to add currency row if missing
         res = self.cursor.execute("SELECT * FROM currency WHERE currency_symbol=?", (symbol,)).fetchone()
         if not res:
             self.cursor.execute("INSERT INTO currency VALUES (?, ?, ?, ?, ?)", ("Tether", symbol, "No", "No", "0"))
-            self.db.commit()
+            if commit:
+                self.db.commit()
 
     # --- Savings ---
     def deposit_savings(self, amount, currency, lock_days=30):
         # Interest rate logic
         rate = 0.05 # 5% APY fixed for demo
         
-        # Debit main balance
-        self.withdraw(amount, currency, "SAVINGS_DEPOSIT")
-        
-        # Add to savings
         lock_until = time.time() + (lock_days * 86400)
         account = self.am.account_key # Assuming single user per AccountManager instance
         
-        self.cursor.execute("INSERT INTO savings VALUES (?, ?, ?, ?, ?)", 
-                            (account, currency, amount, rate, lock_until))
-        self.db.commit()
+        # Debit main balance and add to savings in one transaction
+        try:
+            if not self._debit(currency, amount):
+                raise ValueError("Insufficient funds")
+            self.cursor.execute("INSERT INTO savings (account_id, currency, balance, interest_rate, locked_until, last_accrued) VALUES (?, ?, ?, ?, ?, ?)",
+                                (account, currency, amount, rate, lock_until, time.time()))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         return True
 
     def get_savings_balance(self):
@@ -132,26 +218,104 @@ class DEX:
         ("NGN", "USDT"): 0.001, # 1 NGN ~ 0.001 USDT (Mock)
         ("NGN", "USD"): 0.001,
         ("USDT", "NGN"): 1000.0,
-        ("USD", "NGN"): 1000.0
+        ("USD", "NGN"): 1000.0,
+        ("ZAR", "USD"): 0.055   # 1 ZAR ~ 0.055 USD (Mock)
     }
-    
+
+    # Best-route table: {(from, to): (rate, [from, ..., to])}
+    # Rebuilt lazily whenever POOLS differs from the snapshot it was built from
+    _routes = None
+    _routes_pools = None
+
     @staticmethod
     def get_rate(from_curr, to_curr):
         if from_curr == to_curr: return 1.0
-        
-        pair = (from_curr, to_curr)
-        if pair in DEX.POOLS:
+        # Quotes are served from memory for a short TTL (see quotecache.DEFAULT_TTLS)
+        return quote_cache.get('dex', (from_curr, to_curr), lambda: DEX._quote_rate(from_curr, to_curr))
+
+    @staticmethod
+    def _quote_rate(from_curr, to_curr):
+        rate, path = DEX.get_route(from_curr, to_curr)
+        if len(path) == 2 and (from_curr, to_curr) in DEX.POOLS:
             # Add some volatility or slippage simulation?
-            base_rate = DEX.POOLS[pair]
             fluctuation = random.uniform(0.99, 1.01)
-            return base_rate * fluctuation
-            
-        # Recursive / Inverse path check?
-        inverse = (to_curr, from_curr)
-        if inverse in DEX.POOLS:
-            return (1.0 / DEX.POOLS[inverse])
-            
-        return 0.0 # No pool
+            return rate * fluctuation
+
+        return rate # 0.0 when there is no route at all
+
+    @staticmethod
+    def get_route(from_curr, to_curr):
+        """
+        Best conversion route between two currencies.
+        Returns (rate, path) where path lists every currency hopped through,
+        or (0.0, []) if the currencies are not connected by any pool.
+        """
+        if from_curr == to_curr:
+            return 1.0, [from_curr]
+        return DEX._route_table().get((from_curr, to_curr), (0.0, []))
+
+    @staticmethod
+    def quote_many(pairs):
+        """
+        Price many pairs in one call (for pricing screens).
+        Returns {(from, to): (rate, path)} using the precomputed route table.
+        """
+        routes = DEX._route_table()
+        quotes = {}
+        for from_curr, to_curr in pairs:
+            if from_curr == to_curr:
+                quotes[(from_curr, to_curr)] = (1.0, [from_curr])
+            else:
+                quotes[(from_curr, to_curr)] = routes.get((from_curr, to_curr), (0.0, []))
+        return quotes
+
+    @staticmethod
+    def set_pool_rate(from_curr, to_curr, rate):
+        DEX.POOLS[(from_curr, to_curr)] = rate
+        DEX.invalidate_routes()
+
+    @staticmethod
+    def invalidate_routes():
+        DEX._routes = None
+        DEX._routes_pools = None
+        quote_cache.invalidate('dex')
+
+    @staticmethod
+    def _route_table():
+        if DEX._routes is None or DEX._routes_pools != DEX.POOLS:
+            DEX._routes = DEX._build_routes(DEX.POOLS)
+            DEX._routes_pools = dict(DEX.POOLS)
+        return DEX._routes
+
+    @staticmethod
+    def _build_routes(pools):
+        # Pools form a graph of currencies. A pool is tradable both ways; the
+        # reverse direction uses the inverse rate unless it has its own pool.
+        edges = {pair: rate for pair, rate in pools.items() if rate > 0}
+        for (a, b), rate in list(edges.items()):
+            if (b, a) not in edges:
+                edges[(b, a)] = 1.0 / rate
+
+        # Floyd-Warshall over rate products: keeps the route that gives the most
+        # of the target currency. A longer route has to be strictly better to win.
+        best = {pair: (rate, [pair[0], pair[1]]) for pair, rate in edges.items()}
+        nodes = sorted({c for pair in edges for c in pair})
+        for k in nodes:
+            for i in nodes:
+                if i == k or (i, k) not in best:
+                    continue
+                rate_ik, path_ik = best[(i, k)]
+                for j in nodes:
+                    if j == i or j == k or (k, j) not in best:
+                        continue
+                    rate_kj, path_kj = best[(k, j)]
+                    if set(path_ik) & set(path_kj[1:]):
+                        continue # Would revisit a currency
+                    rate = rate_ik * rate_kj
+                    current = best.get((i, j))
+                    if current is None or rate > current[0] * (1 + 1e-9):
+                        best[(i, j)] = (rate, path_ik + path_kj[1:])
+        return best
 
     @staticmethod
     def swap(account_manager, from_curr, to_curr, amount):
@@ -180,3 +344,177 @@ class DEX:
         
         return receive_amount, rate
 
+    # --- Constant-product pools ---
+    @staticmethod
+    def pool_swap(account_manager, from_curr, to_curr, amount, min_out=0.0):
+        # Swap against the reserve-backed pool instead of the fixed POOLS rate
+        # min_out is checked inside the batch, before anything is written
+        return PoolEngine(account_manager.db).batch_swap([(from_curr, to_curr, amount, min_out)])[0]
+
+    @staticmethod
+    def batch_swap(account_manager, swaps):
+        return PoolEngine(account_manager.db).batch_swap(swaps)
+
+
+class LiquidityPool:
+    # Constant-product market maker: reserve_a * reserve_b = k
+    # A trade moves the reserves along the curve, so bigger trades get worse prices
+
+    def __init__(self, token_a, token_b, reserve_a, reserve_b, fee=0.003):
+        self.token_a = token_a
+        self.token_b = token_b
+        self.reserve_a = float(reserve_a)
+        self.reserve_b = float(reserve_b)
+        self.fee = fee
+
+    def _reserves(self, token_in):
+        if token_in == self.token_a:
+            return self.reserve_a, self.reserve_b
+        if token_in == self.token_b:
+            return self.reserve_b, self.reserve_a
+        raise ValueError(f"{token_in} is not in pool {self.token_a}/{self.token_b}")
+
+    def spot_price(self, token_in):
+        # Marginal rate for an infinitely small trade
+        reserve_in, reserve_out = self._reserves(token_in)
+        return reserve_out / reserve_in
+
+    def get_amount_out(self, token_in, amount_in):
+        reserve_in, reserve_out = self._reserves(token_in)
+        amount_in_after_fee = amount_in * (1 - self.fee)
+        return reserve_out * amount_in_after_fee / (reserve_in + amount_in_after_fee)
+
+    def apply_swap(self, token_in, amount_in):
+        amount_out = self.get_amount_out(token_in, amount_in)
+        # The fee stays in the pool, so k grows slightly with every trade
+        if token_in == self.token_a:
+            self.reserve_a += amount_in
+            self.reserve_b -= amount_out
+        else:
+            self.reserve_b += amount_in
+            self.reserve_a -= amount_out
+        return amount_out
+
+
+class PoolEngine:
+    # Persists pool reserves next to the currency balances so a batch of swaps
+    # can commit reserves and balances together
+    SEED_LIQUIDITY = 1_000_000.0 # Units of the quote currency each seeded pool starts with
+
+    def __init__(self, db):
+        self.db = db
+        self.cursor = self.db.cursor()
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS amm_pools(
+            token_a TEXT,
+            token_b TEXT,
+            reserve_a REAL,
+            reserve_b REAL,
+            fee REAL,
+            PRIMARY KEY (token_a, token_b))""")
+        if self.cursor.execute("SELECT count(*) FROM amm_pools").fetchone()[0] == 0:
+            self._seed_pools()
+        self.db.commit()
+
+    def _seed_pools(self):
+        # Start every DEX pair at its reference rate: reserve_b / reserve_a == rate
+        seeded = set()
+        for (a, b), rate in DEX.POOLS.items():
+            if (b, a) in seeded or rate <= 0:
+                continue
+            seeded.add((a, b))
+            self.cursor.execute("INSERT INTO amm_pools VALUES (?, ?, ?, ?, ?)",
+                                (a, b, self.SEED_LIQUIDITY / rate, self.SEED_LIQUIDITY, 0.003))
+
+    def get_pool(self, token_x, token_y):
+        res = self.cursor.execute(
+            "SELECT token_a, token_b, reserve_a, reserve_b, fee FROM amm_pools "
+            "WHERE (token_a=? AND token_b=?) OR (token_a=? AND token_b=?)",
+            (token_x, token_y, token_y, token_x)).fetchone()
+        if not res:
+            raise ValueError(f"No liquidity pool for {token_x}/{token_y}")
+        return LiquidityPool(*res)
+
+    def quote(self, from_curr, to_curr, amount):
+        return self.get_pool(from_curr, to_curr).get_amount_out(from_curr, amount)
+
+    def batch_swap(self, swaps):
+        """
+        Apply a list of (from_curr, to_curr, amount[, min_out]) swaps in order.
+        Reserves and balances are tracked in memory while the batch runs, then
+        written with one UPDATE per touched pool and currency and a single commit.
+        If any swap has no pool, is not covered by the balance at that point or would
+        receive less than its min_out, nothing is written and a ValueError is raised.
+        Returns the amount received for every swap.
+        """
+        pools = {}
+        balances = {}
+        results = []
+        for i, swap in enumerate(swaps):
+            from_curr, to_curr, amount = swap[:3]
+            min_out = swap[3] if len(swap) > 3 else 0.0
+            key = tuple(sorted((from_curr, to_curr)))
+            if key not in pools:
+                pools[key] = self.get_pool(from_curr, to_curr)
+            for symbol in (from_curr, to_curr):
+                if symbol not in balances:
+                    res = self.cursor.execute("SELECT balance FROM currency WHERE currency_symbol=?", (symbol,)).fetchone()
+                    balances[symbol] = [float(res[0]) if res else 0.0, 0.0, res is not None] # [start, delta, row exists]
+
+            if amount <= 0:
+                raise ValueError(f"Swap {i}: amount must be positive")
+            start, delta, _ = balances[from_curr]
+            if start + delta < amount:
+                raise ValueError(f"Swap {i}: insufficient {from_curr} balance")
+
+            received = pools[key].apply_swap(from_curr, amount)
+            if received < min_out:
+                raise ValueError(f"Swap {i}: slippage, would receive {received} {to_curr}, wanted at least {min_out}")
+            balances[from_curr][1] -= amount
+            balances[to_curr][1] += received
+            results.append(received)
+
+        try:
+            for pool in pools.values():
+                self.cursor.execute("UPDATE amm_pools SET reserve_a=?, reserve_b=? WHERE token_a=? AND token_b=?",
+                                    (pool.reserve_a, pool.reserve_b, pool.token_a, pool.token_b))
+            for symbol, (start, delta, exists) in balances.items():
+                if not exists:
+                    self.cursor.execute("INSERT INTO currency VALUES (?, ?, ?, ?, ?)", (symbol, symbol, "No", "No", "0"))
+                # Guard against the balance having moved under us since it was read
+                self.cursor.execute(
+                    "UPDATE currency SET balance = balance + ? WHERE currency_symbol = ? AND CAST(balance AS REAL) + ? >= 0",
+                    (delta, symbol, delta))
+                if self.cursor.rowcount != 1:
+                    raise ValueError(f"Insufficient {symbol} balance at commit")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return results
+
+
+def benchmark_pool_swaps(n=100000):
+    # Throughput of the pool engine on a scratch database, batched vs one commit per swap
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE currency(currency_name, currency_symbol, default_currency, kyc_auth, balance)")
+    db.executemany("INSERT INTO currency VALUES(?, ?, ?, ?, ?)",
+                   [('Nigerian Naira', 'NGN', 'Yes', 'Yes', '1000000000'), ('Tether', 'USDT', 'No', 'No', '1000000')])
+    engine = PoolEngine(db)
+    swaps = [("NGN", "USDT", 1000.0) if i % 2 else ("USDT", "NGN", 1.0) for i in range(n)]
+
+    start = time.perf_counter()
+    engine.batch_swap(swaps)
+    batched = n / (time.perf_counter() - start)
+
+    single_n = min(n, 5000)
+    start = time.perf_counter()
+    for swap in swaps[:single_n]:
+        engine.batch_swap([swap])
+    single = single_n / (time.perf_counter() - start)
+
+    print(f"Pool engine: {batched:,.0f} swaps/sec batched, {single:,.0f} swaps/sec one commit per swap")
+    return batched, single
+
+
+if __name__ == "__main__":
+    benchmark_pool_swaps()
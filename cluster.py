@@ -0,0 +1,306 @@
+# Copyright (c) 2025 Nikola Tesla
+# Local cluster
+# Runs N NodeManagers in one process on 127.0.0.1 (consecutive ports, one db directory each), wires them
+# into a random peer graph and measures the network as a whole:
+# - Transactions published on random nodes: time until every other node holds them in its mempool
+# - Blocks mined on the miner node: time until every other node has appended them
+# - XML-RPC body bytes in and out per node over the run
+# - Ledger convergence: time from the last block until every node has the same tip
+# Only the RPC servers run: no subnet scan, announce or periodic sync loops, so everything measured
+# is gossip plus the catch-up syncs it triggers. All nodes share one interpreter, so the numbers
+# are for comparing changes on one machine, not for predicting a real network.
+
+import os
+import time
+import random
+import tempfile
+import threading
+from node import NodeManager, CONFIG
+from miner import Miner
+from mempool import ParsedTx
+from account import keyring
+from transaction import TransactionBatch
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """{"p50": ..., "p90": ..., "p99": ..., "max": ...} of a list of numbers (nearest rank), {} if empty."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out = {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+    out["max"] = ordered[-1]
+    return out
+
+
+class PropagationTracker:
+    """
+    Polls every node for tracked items from a background thread and records, per item, how long
+    each node took to get it. have(node) -> bool tells whether a node has the item.
+    """
+
+    def __init__(self, nodes, poll=0.002):
+        self.nodes = nodes
+        self.poll = poll
+        self.items = [] # [start, have, {node index: seconds}, origin index]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def track(self, origin, have):
+        """Start the clock for an item about to be published on node `origin`."""
+        with self._lock:
+            self.items.append([time.monotonic(), have, {origin: 0.0}, origin])
+
+    def _pending(self):
+        with self._lock:
+            return [item for item in self.items if len(item[2]) < len(self.nodes)]
+
+    def _loop(self):
+        while not self._stop.wait(self.poll):
+            for start, have, seen, _ in self._pending():
+                for i, node in enumerate(self.nodes):
+                    if i not in seen and have(node):
+                        with self._lock:
+                            seen[i] = time.monotonic() - start
+
+    def wait(self, timeout=30.0):
+        """Block until every node has every item or timeout passes. Returns True if all arrived."""
+        deadline = time.monotonic() + timeout
+        while self._pending():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll)
+        return True
+
+    def result(self):
+        """Latencies of every (item, node) pair except the origin, and how many pairs never arrived."""
+        latencies = []
+        missed = 0
+        with self._lock:
+            for _, _, seen, origin in self.items:
+                latencies.extend(t for i, t in seen.items() if i != origin)
+                missed += len(self.nodes) - len(seen)
+        return latencies, missed
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Cluster:
+    def __init__(self, size=10, base_port=9800, degree=8, db_root=None, secret=CONFIG["hmac_secret"],
+                 server_mode=None, metrics_base_port=None):
+        """
+        size: number of nodes; node i listens on base_port + i and keeps its files in db_root/node<i>
+        degree: peers each node knows (and gossips to), picked at random; every node also knows the next
+                one so the graph is connected
+        metrics_base_port: if set, node i serves /metrics on metrics_base_port + i
+        """
+        self.size = size
+        self.base_port = base_port
+        self.degree = degree
+        self.db_root = db_root or tempfile.mkdtemp(prefix="xbucks-cluster-")
+        self.secret = secret
+        self.server_mode = server_mode
+        self.metrics_base_port = metrics_base_port
+        self.miners = {} # node index -> Miner mining from that node's mempool into its ledger
+        self.nodes = []
+
+    def start(self):
+        for i in range(self.size):
+            node = NodeManager("127.0.0.1", self.base_port + i, self.secret, server_mode=self.server_mode,
+                               db_dir=os.path.join(self.db_root, f"node{i}"))
+            node.start_server()
+            if self.metrics_base_port is not None:
+                node.start_metrics(port=self.metrics_base_port + i)
+            self.nodes.append(node)
+        self.wire()
+        return self
+
+    def wire(self):
+        for i, node in enumerate(self.nodes):
+            others = [j for j in range(self.size) if j != i]
+            peers = set(random.sample(others, min(self.degree, len(others))))
+            if others:
+                peers.add((i + 1) % self.size)
+            for j in peers:
+                node.peer_db.add_or_update("127.0.0.1", self.base_port + j)
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
+
+    def traffic(self):
+        """[{"in": bytes, "out": bytes}, ...] per node, served and called RPCs together."""
+        out = []
+        for node in self.nodes:
+            c = node.metrics.rpc_bytes
+            out.append({"in": c.value("server", "in") + c.value("client", "in"),
+                        "out": c.value("server", "out") + c.value("client", "out")})
+        return out
+
+    def tips(self):
+        for node in self.nodes:
+            node.ledger.refresh()
+        return [node.ledger.tip() for node in self.nodes]
+
+    def register_account(self, passphrase, account_name="default", rounds=None):
+        """
+        Register an account on node 0 only and let the IXAN registry replicate: every node pulls from its
+        peers (NodeManager.sync_ixans_from) until all of them know the account, at most `rounds` rounds
+        (default: cluster size). Returns the rounds it took, or None if some node never got it.
+        """
+        account = keyring.get(passphrase, account_name=account_name)
+        ixan = account.ixan()
+        self.nodes[0].ixans.register(ixan, account.identity())
+        limit = rounds or self.size
+        for done in range(limit + 1):
+            if all(node.ixans.lookup(ixan) is not None for node in self.nodes):
+                return done
+            if done == limit:
+                break
+            for node in self.nodes:
+                for h, p in node.peer_db.ranked_peers():
+                    try:
+                        node.sync_ixans_from(h, p)
+                    except Exception:
+                        pass
+        return None
+
+    # --- Load ---
+    def inject_txs(self, count, passphrase, account_name="default", receiver=None, amount=100000, interval=0.0,
+                   timeout=30.0):
+        """
+        Sign `count` transactions from one account and publish each on a random node.
+        Amounts are distinct (so no two transactions are identical) and large, so a block of them
+        needs only the minimum number of PoD confirmations.
+        Returns {"latency": percentiles, "missed": pairs that did not arrive within timeout, "elapsed"}.
+        """
+        if receiver is None:
+            receiver = keyring.get(passphrase, account_name=account_name).ixan()
+        batch = TransactionBatch(passphrase, account_name)
+        for i in range(count):
+            batch.add(receiver, amount + i, 0.1, "USD")
+        xmifs = [tx.get_xmif_format() for tx in batch.build()]
+        tracker = PropagationTracker(self.nodes)
+        start = time.monotonic()
+        for xmif in xmifs:
+            origin = random.randrange(self.size)
+            tx_hash = ParsedTx.from_xmif(xmif).hash
+            tracker.track(origin, lambda node, h=tx_hash: node.mempool.get_tx(h) is not None)
+            self.nodes[origin].publish_tx(xmif)
+            if interval:
+                time.sleep(interval)
+        tracker.wait(timeout)
+        tracker.close()
+        latencies, missed = tracker.result()
+        return {"latency": percentiles(latencies), "missed": missed, "elapsed": time.monotonic() - start}
+
+    def mine_block(self, passphrase, account_name="default", miner_index=0, timeout=60.0):
+        """
+        Put the miner node's pending transactions in a block on its tip with a miner.Miner working on that
+        node's mempool and ledger, confirm it and gossip it. Confirmations are solved as validators "node0",
+        "node1", ... in turn, as the network's validators would, so each one is a base-difficulty puzzle.
+        Returns {"latency", "missed", "mining", "index", "published" (time.monotonic())}, or None if there was nothing to mine.
+        """
+        node = self.nodes[miner_index]
+        if miner_index not in self.miners:
+            self.miners[miner_index] = Miner(passphrase, account_name, mempool=node.mempool, ledger=node.ledger)
+        miner = self.miners[miner_index]
+        with node._mempool_lock:
+            txs = list(node.mempool.mempool)
+        if not txs:
+            return None
+        started = time.monotonic()
+        block, amount = miner.build_block(txs)
+        validators = [f"node{(miner_index + i) % self.size}" for i in range(self.size)]
+        if not miner.confirm(block, amount, validators):
+            return None
+        mining = time.monotonic() - started
+        tracker = PropagationTracker(self.nodes)
+        tracker.track(miner_index, lambda n, h=block['hash']: n.ledger.get_block(h) is not None)
+        published = time.monotonic()
+        node.publish_block(block)
+        tracker.wait(timeout)
+        tracker.close()
+        latencies, missed = tracker.result()
+        return {"latency": percentiles(latencies), "missed": missed, "mining": mining, "index": block['index'],
+                "published": published}
+
+    def wait_converged(self, since=None, timeout=60.0, poll=0.01):
+        """Seconds from `since` (time.monotonic(), default now) until every node has the same ledger tip,
+        or None if it did not happen within timeout."""
+        start = time.monotonic() if since is None else since
+        while time.monotonic() - start < timeout:
+            if len(set(self.tips())) == 1:
+                return time.monotonic() - start
+            time.sleep(poll)
+        return None
+
+
+def run(passphrase, account_name="default", size=10, degree=8, txs_per_block=20, blocks=2, base_port=9800,
+        server_mode=None, metrics_base_port=None):
+    """
+    Start a cluster, then for each block: publish txs_per_block transactions on random nodes, mine them
+    on node 0 (as the account) and gossip the block. Prints and returns the report.
+    The account must exist. It is registered on node 0 and reaches the other nodes through IXAN registry
+    replication before any transaction is sent.
+    """
+    cluster = Cluster(size, base_port, degree, server_mode=server_mode, metrics_base_port=metrics_base_port).start()
+    print(f"Cluster: {size} nodes on 127.0.0.1:{base_port}-{base_port + size - 1}, degree {degree}, db {cluster.db_root}")
+    report = {"nodes": size, "degree": degree, "txs": [], "blocks": []}
+    try:
+        before = cluster.traffic()
+        report["registry_rounds"] = cluster.register_account(passphrase, account_name)
+        start = time.monotonic()
+        for _ in range(blocks):
+            report["txs"].append(cluster.inject_txs(txs_per_block, passphrase, account_name))
+            mined = cluster.mine_block(passphrase, account_name)
+            if mined is not None:
+                report["blocks"].append(mined)
+        report["convergence"] = cluster.wait_converged(report["blocks"][-1]["published"] if report["blocks"] else None)
+        report["elapsed"] = time.monotonic() - start
+        after = cluster.traffic()
+        report["traffic"] = [{"in": a["in"] - b["in"], "out": a["out"] - b["out"]} for a, b in zip(after, before)]
+        report["heights"] = sorted({height for height, _ in cluster.tips()})
+    finally:
+        cluster.stop()
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    def fmt(p):
+        return " ".join(f"{k}={v * 1000:.1f}ms" for k, v in p.items()) or "-"
+
+    print(f"\n=== Cluster report: {report['nodes']} nodes, degree {report['degree']} ===")
+    rounds = report.get("registry_rounds")
+    print(f"IXAN registry replicated in {'-' if rounds is None else rounds} rounds")
+    for i, r in enumerate(report["txs"]):
+        print(f"txs round {i + 1}: {fmt(r['latency'])} missed={r['missed']} ({r['elapsed']:.2f}s)")
+    for r in report["blocks"]:
+        print(f"block {r['index']}: {fmt(r['latency'])} missed={r['missed']} (mined in {r['mining']:.1f}s)")
+    conv = report.get("convergence")
+    print(f"convergence after last block: {'not reached' if conv is None else f'{conv * 1000:.1f}ms'}, "
+          f"heights {report.get('heights')}")
+    traffic = report.get("traffic", [])
+    if traffic:
+        totals = [t["in"] + t["out"] for t in traffic]
+        elapsed = max(report.get("elapsed", 0), 1e-9)
+        print(f"bytes per node (in+out): min={min(totals)} median={sorted(totals)[len(totals) // 2]} "
+              f"max={max(totals)}; cluster total {sum(t['out'] for t in traffic)} bytes sent, "
+              f"{sum(totals) / len(totals) / elapsed / 1024:.1f} KiB/s per node")
+        for i, t in enumerate(traffic):
+            print(f"  node{i}: in={t['in']} out={t['out']}")
+
+
+if __name__ == "__main__":
+    import sys
+    # python cluster.py passphrase [account_name] [nodes] [blocks]
+    args = sys.argv[1:]
+    if not args:
+        print("usage: python cluster.py passphrase [account_name] [nodes] [blocks]")
+        sys.exit(1)
+    run(args[0], account_name=args[1] if len(args) > 1 else "default",
+        size=int(args[2]) if len(args) > 2 else 10, blocks=int(args[3]) if len(args) > 3 else 2)
@@ -0,0 +1,79 @@
+# Copyright (c) 2025 Nikola Tesla
+# Compact blocks
+# A block relayed as its header, its confirmations and a short ID per transaction.
+# The receiver rebuilds the transaction list from its own Mempool and only asks the sender
+# for the transactions it does not hold. The rebuilt list must hash to the header's merkle_root.
+# Short IDs are salted with the block hash, so two transactions that collide in one block
+# almost certainly do not collide in the next.
+
+import json
+import hashlib
+
+SHORT_ID_CHARS = 12 # 48 bits of hex
+HEADER_FIELDS = ('index', 'prev_hash', 'merkle_root', 'hash')
+
+
+def tx_hash(tx):
+    # Block transactions are XMIF dicts, hashed like ParsedTx (sha256 of the mc string)
+    if isinstance(tx, dict) and 'mc' in tx:
+        return hashlib.sha256(tx['mc'].encode('utf-8')).hexdigest()
+    return hashlib.sha256(json.dumps(tx, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def short_id(block_hash, txid):
+    return hashlib.sha256((block_hash + txid).encode('utf-8')).hexdigest()[:SHORT_ID_CHARS]
+
+
+def merkle_root(transactions):
+    # Same fingerprint the miner puts in the block
+    return hashlib.sha256(json.dumps(transactions, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def encode(block):
+    """
+    Compact form of a block:
+    {"header": {...}, "confirmations": [...], "short_ids": [...], "prefilled": [[position, tx], ...]}
+    Transactions that are not XMIF dicts cannot be in anyone's mempool and are sent whole.
+    """
+    header = {field: block.get(field) for field in HEADER_FIELDS}
+    short_ids = []
+    prefilled = []
+    for position, tx in enumerate(block.get('transactions', [])):
+        if isinstance(tx, dict) and 'mc' in tx:
+            short_ids.append(short_id(block['hash'], tx_hash(tx)))
+        else:
+            short_ids.append(None)
+            prefilled.append([position, tx])
+    return {'header': header, 'confirmations': block.get('confirmations', []),
+            'short_ids': short_ids, 'prefilled': prefilled}
+
+
+def mempool_index(block_hash, txs):
+    """{short_id: xmif} for candidate transactions (ParsedTx objects), salted for one block."""
+    return {short_id(block_hash, tx.hash): tx.to_xmif() for tx in txs}
+
+
+def reconstruct(compact, index):
+    """
+    Fill the transaction list from index ({short_id: xmif}).
+    Returns (transactions, missing) where missing lists the positions still to fetch
+    (their slots hold None).
+    """
+    transactions = [index.get(sid) if sid is not None else None for sid in compact['short_ids']]
+    for position, tx in compact['prefilled']:
+        transactions[position] = tx
+    missing = [i for i, tx in enumerate(transactions) if tx is None]
+    return transactions, missing
+
+
+def assemble(compact, transactions):
+    """Build the full block and check the transactions against the header's merkle_root.
+    Raises ValueError if they do not match (short ID collision or a stale mempool entry)."""
+    header = compact['header']
+    if merkle_root(transactions) != header['merkle_root']:
+        raise ValueError(f"Block {header['index']}: reconstructed transactions do not match merkle_root")
+    block = dict(header)
+    block['transactions'] = transactions
+    block['confirmations'] = compact['confirmations']
+    # Same key order as the miner
+    return {key: block[key] for key in ('index', 'prev_hash', 'transactions', 'confirmations', 'merkle_root', 'hash')}
@@ -2,6 +2,7 @@
 import os
 import time
 import requests
+from quotecache import quote_cache
 
 class UniswapService:
     def __init__(self, provider_url=None):
@@ -10,7 +11,10 @@ class UniswapService:
         print(f"Uniswap: Initialized with provider {self.provider_url}")
 
     def get_price(self, token_in="ETH", token_out="USDT"):
-        """Fetch current price from Uniswap."""
+        """Fetch current price from Uniswap (cached, see quotecache)."""
+        return quote_cache.get('uniswap', (token_in, token_out), lambda: self._fetch_price(token_in, token_out))
+
+    def _fetch_price(self, token_in, token_out):
         # Mocking real price fetch
         prices = {"ETH/USDT": 2500.0, "BTC/USDT": 65000.0}
         pair = f"{token_in}/{token_out}"
@@ -34,10 +38,15 @@ class YellowCardAPI:
 
     def get_quotes(self, base="NGN", target="USDT", amount=1000):
         """Get conversion rate between fiat and USDT."""
-        print(f"YC: Getting quote for {amount} {base} -> {target}")
-        rate = 1550.0 if base == "NGN" else 1.0 
+        # The rate is cached per pair, the total is worked out for this amount
+        rate = quote_cache.get('yellowcard', (base, target), lambda: self._fetch_rate(base, target))
         return {"rate": rate, "total_target": amount / rate}
 
+    def _fetch_rate(self, base, target):
+        print(f"YC: Getting quote for {base} -> {target}")
+        rate = 1550.0 if base == "NGN" else 1.0 
+        return rate
+
     def initiate_on_ramp(self, amount, currency="NGN"):
         """Production level on-ramp instruction fetch."""
         return {
@@ -0,0 +1,63 @@
+# Copyright (c) 2025 Nikola Tesla
+# Fan-out executor
+# Runs one call per peer concurrently on a bounded worker pool, in rounds:
+# - Large peer tables are capped to a random subset of max_targets peers per round; for a ranked
+#   peer list the subset is drawn from the best 2 * max_targets, so fast healthy peers are preferred
+# - A round returns at its deadline, whatever is still running is counted as timed out
+# - Every round reports how many calls succeeded, failed or timed out
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class FanOut:
+    def __init__(self, workers=32, max_targets=64, deadline=10.0, name="fanout"):
+        self.workers = workers
+        self.max_targets = max_targets
+        self.deadline = deadline # Seconds per round
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.last_round = None
+        self.totals = {"rounds": 0, "ok": 0, "failed": 0, "timed_out": 0}
+        self._lock = threading.Lock()
+
+    def run(self, targets, fn, max_targets=None, deadline=None, ranked=False):
+        """
+        Call fn(host, port) for each (host, port) in targets, at most max_targets of them
+        picked at random (among the best 2 * max_targets if ranked: targets are ordered best first).
+        A call succeeds if it returns a truthy value without raising.
+        Returns {"targets", "ok", "failed", "timed_out", "elapsed"}.
+        """
+        targets = list(targets)
+        cap = self.max_targets if max_targets is None else max_targets
+        if cap is not None and len(targets) > cap:
+            targets = random.sample(targets[:2 * cap] if ranked else targets, cap)
+        start = time.monotonic()
+        futures = [self.executor.submit(fn, host, port) for host, port in targets]
+        done, not_done = wait(futures, timeout=self.deadline if deadline is None else deadline)
+        ok = failed = 0
+        for future in done:
+            try:
+                if future.result():
+                    ok += 1
+                else:
+                    failed += 1
+            except Exception:
+                failed += 1
+        for future in not_done:
+            # Queued calls are dropped; calls already running finish in the background
+            future.cancel()
+        result = {"targets": len(targets), "ok": ok, "failed": failed, "timed_out": len(not_done),
+                  "elapsed": time.monotonic() - start}
+        with self._lock:
+            self.last_round = result
+            self.totals["rounds"] += 1
+            self.totals["ok"] += ok
+            self.totals["failed"] += failed
+            self.totals["timed_out"] += len(not_done)
+        return result
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,163 @@
 # Copyright (c) 2025 Nikola Tesla
-# Gossip protocol 
+# Gossip protocol
 # HTTP protocol for connecting to other nodes in my dictionary and sending and receiving data from them.
+# Epidemic propagation of transactions and blocks:
+# - A node that gets something new sends an inventory (kind + hash only) to `fanout` random peers,
+#   picked among its best ranked ones
+# - A peer that does not have an announced item pulls it from the announcer (getdata)
+# - Once the item is accepted locally the peer announces it onwards, so it reaches N nodes in O(log N) hops
+# - A seen-set stops an item from being pulled or announced twice by the same node
+
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fanout import FanOut
+
 
 class Gossip:
-    def __init__(self):
-        pass
+    def __init__(self, self_addr, call, peers, fanout=4, workers=8, seen_size=100000, max_getdata=500,
+                 deadline=5.0):
+        """
+        self_addr: "host:port" other nodes know us by
+        call: call(host, port, method, payload) -> result of a signed RPC on a peer
+        peers: peers() -> [(host, port), ...] to gossip with, best first (PeerDB.ranked_peers)
+        deadline: seconds an announcement round may take
+        """
+        self.self_addr = self_addr
+        self.call = call
+        self.peers = peers
+        self.fanout = fanout
+        self.max_getdata = max_getdata # Items served per getdata request
+        self.seen_size = seen_size
+        self.handlers = {} # kind -> (have, get, put)
+        self.seen = OrderedDict() # (kind, hash) -> None, oldest first
+        self.requested = set() # (kind, hash) being pulled right now
+        self.stats = {"inv_sent": 0, "inv_received": 0, "pulled": 0, "rejected": 0, "duplicates": 0}
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gossip")
+        # Announcement rounds: `fanout` random peers out of the best ranked, sent concurrently. A round waits for its sends
+        # until the deadline, so rounds run on their own threads and never hold up a pull.
+        self.fan_out = FanOut(workers=workers, max_targets=fanout, deadline=deadline, name="gossip-inv")
+        self.announcer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gossip-announce")
+
+    def register(self, kind, have, get, put):
+        """
+        have(hash) -> bool: is the item already stored here
+        get(hash) -> payload string, or None
+        put(hash, payload, source) -> bool: verify and store an item pulled from source ("host:port")
+        """
+        self.handlers[kind] = (have, get, put)
+
+    # --- Seen-set ---
+    def _mark_seen(self, key):
+        # Caller holds the lock. Returns False if the key was already seen.
+        if key in self.seen:
+            return False
+        self.seen[key] = None
+        if len(self.seen) > self.seen_size:
+            self.seen.popitem(last=False)
+        return True
+
+    # --- Outgoing ---
+    def publish(self, kind, hash_):
+        """Announce an item that is already stored locally (new transaction, mined or received block)."""
+        with self._lock:
+            if not self._mark_seen((kind, hash_)):
+                return
+        self._announce([[kind, hash_]], exclude=None)
+
+    def broadcast(self, kind, hash_, max_targets=None):
+        """
+        Announce a stored item to up to max_targets peers (instead of `fanout`), waiting for the round.
+        Sent even if the item was announced before. Returns the FanOut round result.
+        """
+        with self._lock:
+            self._mark_seen((kind, hash_))
+        return self._round([[kind, hash_]], None, max_targets)
+
+    def _announce(self, items, exclude):
+        # The round waits on its own pool; run it off the caller's thread
+        self.announcer.submit(self._round, items, exclude)
+
+    def _round(self, items, exclude, max_targets=None):
+        candidates = [(h, p) for h, p in self.peers() if f"{h}:{p}" not in (self.self_addr, exclude)]
+        payload = json.dumps({"from": self.self_addr, "items": items})
+        return self.fan_out.run(candidates, lambda host, port: self._send_inv(host, port, payload), max_targets=max_targets,
+                                ranked=True)
+
+    def _send_inv(self, host, port, payload):
+        result = self.call(host, port, "gossip_inv", payload)
+        with self._lock:
+            self.stats["inv_sent"] += 1
+        return isinstance(result, dict) and result.get("success")
+
+    # --- Incoming ---
+    def on_inv(self, payload):
+        """Handle an inventory: schedule a pull of the items we neither have nor are fetching.
+        Returns the number of items requested."""
+        message = json.loads(payload)
+        source = message["from"]
+        wanted = []
+        with self._lock:
+            self.stats["inv_received"] += 1
+            for kind, hash_ in message["items"]:
+                key = (kind, hash_)
+                if kind not in self.handlers or key in self.seen or key in self.requested:
+                    self.stats["duplicates"] += 1
+                    continue
+                wanted.append(key)
+        # The store check runs outside the lock; it may touch the disk
+        wanted = [key for key in wanted if not self.handlers[key[0]][0](key[1])]
+        with self._lock:
+            wanted = [key for key in wanted if key not in self.requested]
+            self.requested.update(wanted)
+        if wanted:
+            self.executor.submit(self._pull, source, wanted)
+        return len(wanted)
+
+    def _pull(self, source, keys):
+        accepted = []
+        try:
+            host, port = source.rsplit(":", 1)
+            reply = json.loads(self.call(host, int(port), "gossip_getdata", json.dumps({"items": [list(k) for k in keys]})))
+            for kind, hash_, item in reply["items"]:
+                key = (kind, hash_)
+                if key not in self.requested or kind not in self.handlers:
+                    continue
+                try:
+                    ok = self.handlers[kind][2](hash_, item, source)
+                except Exception:
+                    ok = False
+                with self._lock:
+                    if ok:
+                        self.stats["pulled"] += 1
+                        if self._mark_seen(key):
+                            accepted.append([kind, hash_])
+                    else:
+                        self.stats["rejected"] += 1
+        except Exception:
+            pass
+        finally:
+            # Anything not delivered can be pulled from the next peer that announces it
+            with self._lock:
+                self.requested.difference_update(keys)
+        if accepted:
+            self._announce(accepted, exclude=source)
+
+    def on_getdata(self, payload):
+        """Return the requested items we have, as a json string: {"items": [[kind, hash, payload], ...]}"""
+        items = []
+        for kind, hash_ in json.loads(payload)["items"][:self.max_getdata]:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                continue
+            item = handler[1](hash_)
+            if item is not None:
+                items.append([kind, hash_, item])
+        return json.dumps({"items": items})
+
+    def close(self):
+        self.fan_out.close()
+        self.announcer.shutdown(wait=False)
+        self.executor.shutdown(wait=False)
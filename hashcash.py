@@ -5,6 +5,7 @@ import hashlib
 import json
 import time
 import math
+from mempool import ParsedTx
 
 # ----------------- Utilities -----------------
 def sha256_hex(data: str) -> str:
@@ -15,6 +16,15 @@ def leading_zero_bits(hex_digest: str) -> int:
     b = bin(int(hex_digest, 16))[2:].zfill(256)
     return len(b) - len(b.lstrip('0'))
 
+# Work done by solve_puzzle in this process, read by the miner metrics (Miner.start_metrics)
+MINER_STATS = {'hashes': 0, 'seconds': 0.0, 'last_hashrate': 0.0}
+
+def _record_work(hashes, seconds):
+    MINER_STATS['hashes'] += hashes
+    MINER_STATS['seconds'] += seconds
+    if seconds > 0:
+        MINER_STATS['last_hashrate'] = hashes / seconds
+
 # ----------------- PoD Consensus Engine -----------------
 
 class ProofOfDiplomacy:
@@ -66,9 +76,11 @@ class ProofOfDiplomacy:
             h = sha256_hex(payload)
             
             if leading_zero_bits(h) >= difficulty:
+                _record_work(nonce + 1, time.time() - start_time)
                 return nonce, h, ts_ms
             
             nonce += 1
+        _record_work(nonce, time.time() - start_time)
         return None, None, None
 
     def verify_confirmation(self, block_hash, conf):
@@ -88,12 +100,15 @@ class ProofOfDiplomacy:
             return False
         return True
 
-    def check_block_status(self, block):
+    def check_block_status(self, block, amount=None):
         # Check if block has enough confirmations
+        # amount can be passed in by callers that already parsed the transactions (the miner)
         # 1. Calc N
         txs = block.get('transactions', [])
         size = len(json.dumps(txs, default=str))
-        amount = sum(float(tx.get('mc', '').split('|')[2].split('"amount": "')[1].split('"')[0]) for tx in txs if 'mc' in tx) # Rough parsing
+        if amount is None:
+            amount = sum(tx.amount if isinstance(tx, ParsedTx) else ParsedTx.from_xmif(tx).amount
+                         for tx in txs if isinstance(tx, ParsedTx) or 'mc' in tx)
         if amount == 0: amount = 1
         
         n_required = self.calculate_n(size, amount)
@@ -0,0 +1,213 @@
+# Copyright (c) 2025 Nikola Tesla
+# Block ingest
+# Pipeline for blocks arriving from other nodes (receive_block, gossip):
+#   submit -> dedup by hash -> verify on a worker pool -> one writer thread appends to the Ledger
+# - A block whose hash is already stored or queued, or an exact copy of a known bad block, is a duplicate
+# - Verification (block hash, merkle root, PoD confirmations) never runs on the RPC thread
+# - A block that arrives before its parent waits in an orphan queue keyed by prev_hash and is
+#   appended as soon as the parent is
+# - Only the writer thread appends, so the chain is extended in order
+
+import json
+import queue
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ledger import block_hash
+
+ACCEPTED = "accepted" # Queued for verification
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+# Final states reported by state() / wait()
+APPENDED = "appended"
+ORPHAN = "orphan"
+INVALID = "invalid"
+STALE = "stale" # Valid, but its parent is not our tip (a fork we do not follow)
+
+
+def fingerprint(block):
+    # Digest of the whole block, confirmations included. Bad blocks are remembered by this, not by
+    # their hash, so a forged copy cannot get the genuine block refused.
+    return hashlib.sha256(json.dumps(block, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def verify_block(block, pod):
+    """Check the block hash, the merkle root and every PoD confirmation, and that there are enough of them."""
+    if block_hash(block) != block.get('hash'):
+        return False
+    repeats = {}
+    for conf in block.get('confirmations', []):
+        # A validator confirming again must solve a harder puzzle (see calculate_difficulty)
+        required = pod.base_difficulty + 4 * repeats.get(conf.get('validator'), 0)
+        if conf.get('difficulty', 0) < required or not pod.verify_confirmation(block['hash'], conf):
+            return False
+        repeats[conf['validator']] = repeats.get(conf['validator'], 0) + 1
+    is_valid, _ = pod.check_block_status(block)
+    return is_valid
+
+
+class BlockIngest:
+    def __init__(self, ledger, pod=None, workers=4, max_orphans=1024, max_rejected=10000,
+                 on_accept=None, on_orphan=None):
+        if pod is None:
+            from hashcash import get_pod_engine
+            pod = get_pod_engine()
+        self.ledger = ledger
+        self.pod = pod
+        self.max_orphans = max_orphans
+        self.max_rejected = max_rejected
+        self.on_accept = on_accept # on_accept(block) after it is appended
+        self.on_orphan = on_orphan # on_orphan(block) when its parent is missing
+        self.stats = {"accepted": 0, "duplicates": 0, "invalid": 0, "orphans": 0, "appended": 0, "stale": 0}
+        self._pending = {} # hash -> "verifying" / "queued" / "orphan"
+        self._orphans = OrderedDict() # prev_hash -> [block, ...], oldest first
+        self._orphan_count = 0
+        self._done = OrderedDict() # hash -> final state for blocks that did not make it into the ledger
+        self._invalid = OrderedDict() # fingerprint -> None for blocks that failed verification
+        self._cond = threading.Condition()
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    # --- Request side ---
+    def submit(self, block):
+        """Hand a block to the pipeline. Returns ACCEPTED, DUPLICATE or REJECTED (malformed) at once."""
+        if not isinstance(block, dict) or not isinstance(block.get('hash'), str) or 'prev_hash' not in block:
+            return REJECTED
+        hash_ = block['hash']
+        with self._cond:
+            if hash_ in self._pending or self._done.get(hash_) == STALE or self.ledger.get_block(hash_) is not None:
+                self.stats["duplicates"] += 1
+                return DUPLICATE
+        if self._invalid:
+            digest = fingerprint(block)
+            with self._cond:
+                if digest in self._invalid:
+                    self.stats["duplicates"] += 1
+                    return DUPLICATE
+        with self._cond:
+            if hash_ in self._pending:
+                self.stats["duplicates"] += 1
+                return DUPLICATE
+            self._done.pop(hash_, None)
+            self._pending[hash_] = "verifying"
+            self.stats["accepted"] += 1
+        self._executor.submit(self._verify, block)
+        return ACCEPTED
+
+    def state(self, hash_):
+        """Where a block is: APPENDED, a pending stage, a final failure state, or None if unknown."""
+        with self._cond:
+            return self._state(hash_)
+
+    def _state(self, hash_):
+        if self.ledger.get_block(hash_) is not None:
+            return APPENDED
+        return self._pending.get(hash_) or self._done.get(hash_)
+
+    def wait(self, hash_, timeout=10.0):
+        """Block until the block is appended, orphaned or dropped; returns its state."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._state(hash_) not in ("verifying", "queued"), timeout)
+            return self._state(hash_)
+
+    # --- Pipeline ---
+    def _finish(self, hash_, state):
+        # Caller holds the lock
+        self._pending.pop(hash_, None)
+        if state != APPENDED:
+            self._done[hash_] = state
+            if len(self._done) > self.max_rejected:
+                self._done.popitem(last=False)
+        self._cond.notify_all()
+
+    def _verify(self, block):
+        try:
+            ok = verify_block(block, self.pod)
+        except Exception:
+            ok = False
+        with self._cond:
+            if not ok:
+                self.stats["invalid"] += 1
+                self._invalid[fingerprint(block)] = None
+                if len(self._invalid) > self.max_rejected:
+                    self._invalid.popitem(last=False)
+                self._finish(block['hash'], INVALID)
+                return
+            self._pending[block['hash']] = "queued"
+        self._queue.put(block)
+
+    def _write_loop(self):
+        while True:
+            try:
+                block = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                # The tip may have moved without us (ledger sync, a local miner): retry orphans on it
+                self.ledger.refresh()
+                self._release_orphans(self.ledger.tip()[1])
+                continue
+            if block is None:
+                return
+            try:
+                self._write(block)
+            except Exception as e:
+                print(f"Block ingest: failed to write block {block.get('index')}: {e}")
+                with self._cond:
+                    self._finish(block['hash'], INVALID)
+
+    def _write(self, block):
+        hash_ = block['hash']
+        self.ledger.refresh()
+        if self.ledger.get_block(hash_) is not None:
+            # Arrived by another route (ledger sync) meanwhile
+            with self._cond:
+                self._finish(hash_, APPENDED)
+            return
+        _, tip = self.ledger.tip()
+        if block['prev_hash'] == tip:
+            self.ledger.append_blocks([block])
+            with self._cond:
+                self.stats["appended"] += 1
+                self._finish(hash_, APPENDED)
+            if self.on_accept is not None:
+                self.on_accept(block)
+            self._release_orphans(hash_)
+        elif self.ledger.get_block(block['prev_hash']) is not None:
+            with self._cond:
+                self.stats["stale"] += 1
+                self._finish(hash_, STALE)
+        else:
+            self._add_orphan(block)
+
+    def _add_orphan(self, block):
+        with self._cond:
+            self._orphans.setdefault(block['prev_hash'], []).append(block)
+            self._orphan_count += 1
+            self.stats["orphans"] += 1
+            self._pending[block['hash']] = ORPHAN
+            # Drop the oldest orphans past the limit
+            while self._orphan_count > self.max_orphans:
+                _, dropped = self._orphans.popitem(last=False)
+                self._orphan_count -= len(dropped)
+                for old in dropped:
+                    self._pending.pop(old['hash'], None)
+            self._cond.notify_all()
+        if self.on_orphan is not None:
+            self.on_orphan(block)
+
+    def _release_orphans(self, parent_hash):
+        # Children of a block that is now our tip go back through the writer (already verified)
+        with self._cond:
+            children = self._orphans.pop(parent_hash, [])
+            self._orphan_count -= len(children)
+            for child in children:
+                self._pending[child['hash']] = "queued"
+        for child in children:
+            self._queue.put(child)
+
+    def close(self):
+        self._queue.put(None)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,185 @@
+# Copyright (c) 2025 Nikola Tesla
+# IXAN (International XBucks Account Number) helpers
+# An IXAN is a 12 digit account number derived from the account's public identity
+# The registry maps IXANs to identities (and back) so accounts can be found without scanning anything.
+# Nodes replicate it from their peers (NodeManager.sync_ixans_from), so a transaction verifies on any node
+# against the key its sender registered, never against a key the transaction brings along
+
+import os
+import sqlite3
+import hashlib
+import threading
+
+IXAN_LENGTH = 12
+
+
+def derive_ixan(identity):
+    """
+    Deterministic IXAN for an identity (the PEM body returned by Account.identity()).
+    The digits already present in the identity come first, as they always have, and
+    the rest is filled from a SHA-256 of the identity, so the same key always gets the
+    same IXAN in constant time.
+    """
+    identity = identity.replace('\n', '')
+    digits = ''.join(c for c in identity if c.isdigit())[:IXAN_LENGTH]
+    pad = IXAN_LENGTH - len(digits)
+    if pad:
+        filler = int(hashlib.sha256(identity.encode('utf-8')).hexdigest(), 16) % (10 ** pad)
+        digits += str(filler).zfill(pad)
+    return digits
+
+
+def is_ixan(value):
+    return isinstance(value, str) and len(value) == IXAN_LENGTH and value.isdigit()
+
+
+class IXANRegistry:
+    # Persistent IXAN <-> identity index, mirrored in memory for O(1) lookups
+    # Every entry has a version so nodes can replicate the registry incrementally (see changes_since)
+    def __init__(self, db_path='./db/ixan.db'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ixans (
+                ixan TEXT PRIMARY KEY,
+                identity TEXT NOT NULL UNIQUE
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(ixans)")]
+        if 'version' not in columns:
+            # Registries from before replication: number the existing entries so peers pull them too
+            self.conn.execute("ALTER TABLE ixans ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE ixans SET version = rowid WHERE version = 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ixans_version ON ixans (version)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                peer TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self._by_ixan = dict(self.conn.execute("SELECT ixan, identity FROM ixans").fetchall())
+        self._by_identity = {identity: ixan for ixan, identity in self._by_ixan.items()}
+
+    def register(self, ixan, identity):
+        """
+        Record that ixan belongs to identity.
+        Raises ValueError if the IXAN already belongs to another identity, or if the
+        identity is already registered under a different IXAN.
+        """
+        with self._lock:
+            added = self._add(ixan, identity)
+            self.conn.commit()
+            return added
+
+    def _add(self, ixan, identity):
+        # Caller holds the lock and commits
+        owner = self._lookup(ixan)
+        if owner is not None:
+            if owner != identity:
+                raise ValueError(f"IXAN collision: {ixan} is already assigned to another identity")
+            return ixan
+        existing = self._by_identity.get(identity)
+        if existing is None:
+            row = self.conn.execute("SELECT ixan FROM ixans WHERE identity = ?", (identity,)).fetchone()
+            existing = row[0] if row else None
+        if existing is not None:
+            raise ValueError(f"Identity is already registered under IXAN {existing}")
+        version = self.conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM ixans").fetchone()[0]
+        self.conn.execute("INSERT INTO ixans (ixan, identity, version) VALUES (?, ?, ?)", (ixan, identity, version))
+        self._by_ixan[ixan] = identity
+        self._by_identity[identity] = ixan
+        return ixan
+
+    def _lookup(self, ixan):
+        # Caller holds the lock. A miss goes to the database, so entries written by another
+        # process sharing the file (an account registering itself next to a running node) are found
+        identity = self._by_ixan.get(ixan)
+        if identity is None:
+            row = self.conn.execute("SELECT identity FROM ixans WHERE ixan = ?", (ixan,)).fetchone()
+            if row:
+                identity = row[0]
+                self._by_ixan[ixan] = identity
+                self._by_identity[identity] = ixan
+        return identity
+
+    def lookup(self, ixan):
+        # IXAN -> identity, or None
+        identity = self._by_ixan.get(ixan)
+        if identity is not None:
+            return identity
+        with self._lock:
+            return self._lookup(ixan)
+
+    def lookup_ixan(self, identity):
+        # identity -> IXAN, or None
+        return self._by_identity.get(identity)
+
+    # --- Replication ---
+    def get_version(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM ixans").fetchone()[0]
+
+    def changes_since(self, version, limit=500):
+        """
+        Entries added after `version`, oldest first, at most `limit` of them.
+        Returns a list of (ixan, identity, version).
+        """
+        with self._lock:
+            return self.conn.execute("SELECT ixan, identity, version FROM ixans WHERE version > ? ORDER BY version LIMIT ?",
+                                     (int(version), int(limit))).fetchall()
+
+    def apply_records(self, records):
+        """
+        Merge (ixan, identity, ...) entries pulled from a peer.
+        Entries are never overwritten: the first binding of an IXAN a node sees is the one it
+        keeps, and entries that collide with it are skipped. Accepted entries get a fresh local
+        version so they are passed on to our own peers. Returns the number of entries accepted.
+        """
+        applied = 0
+        with self._lock:
+            for ixan, identity, *_ in records:
+                if not is_ixan(ixan) or self._lookup(ixan) == identity:
+                    continue
+                try:
+                    self._add(ixan, identity)
+                except ValueError as e:
+                    print(f"IXAN sync: skipped {ixan}: {e}")
+                    continue
+                applied += 1
+            self.conn.commit()
+        return applied
+
+    def get_sync_cursor(self, peer):
+        with self._lock:
+            row = self.conn.execute("SELECT version FROM sync_cursors WHERE peer = ?", (peer,)).fetchone()
+            return row[0] if row else 0
+
+    def set_sync_cursor(self, peer, version):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_cursors (peer, version) VALUES (?, ?)", (peer, int(version)))
+            self.conn.commit()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(db_path='./db/ixan.db'):
+    # One registry per database file for the whole process
+    with _registries_lock:
+        if db_path not in _registries:
+            _registries[db_path] = IXANRegistry(db_path)
+        return _registries[db_path]
+
+
+if __name__ == "__main__":
+    import tempfile
+    # Scratch registry, so the demo identity never lands in ./db/ixan.db
+    registry = IXANRegistry(os.path.join(tempfile.mkdtemp(), 'ixan.db'))
+    ixan = derive_ixan("MFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAE")
+    print(f"IXAN: {ixan}")
+    registry.register(ixan, "MFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAE")
+    print(f"Owner: {registry.lookup(ixan)}")
@@ -2,13 +2,23 @@
 # Ledger class
 # Interface to the Ledger database file which is an unbroken chain of transactions
 import os
+import json
+import base64
+import pickle
+import hashlib
 import binascii
+import threading
+
+GENESIS_PREV_HASH = '0' * 64
 
 class Ledger:
-    def __init__(self):
+    def __init__(self, db_path=os.path.join('db/ledger.data')):
         self.ledger = []
         self.sep = b'\n'
-        self.db_path = os.path.join('db/ledger.data')
+        self.db_path = db_path
+        self._offset = 0 # Bytes of the file already loaded into self.ledger
+        self.by_hash = {} # block hash -> block
+        self._lock = threading.RLock()
         self.load_ledger()
    
     def read(self):
@@ -21,41 +31,119 @@ class Ledger:
             return b''
 
     def load_ledger(self):
-        import base64
-        import pickle
-        data = self.read()
-        entries = data.split(self.sep)
-        for i in entries:
-            if len(i) < 1:
-                continue
+        with self._lock:
+            self.ledger = []
+            self.by_hash = {}
+            self._offset = 0
+            self.refresh()
+
+    def refresh(self):
+        """
+        Load entries appended to the file since the last load (by this or another process).
+        Only whole lines are consumed, so an entry still being written is picked up next time.
+        Returns the number of new entries.
+        """
+        with self._lock:
             try:
-                decoded = base64.b64decode(i)
-                # Assuming entry is pickled transaction/block
-                entry = pickle.loads(decoded)
-                self.ledger.append(entry)
-            except Exception:
-                continue
+                if os.path.getsize(self.db_path) <= self._offset:
+                    return 0
+                with open(self.db_path, 'rb') as file:
+                    file.seek(self._offset)
+                    data = file.read()
+            except OSError:
+                return 0
+            end = data.rfind(self.sep) + 1
+            added = 0
+            for i in data[:end].split(self.sep):
+                if len(i) < 1:
+                    continue
+                try:
+                    decoded = base64.b64decode(i)
+                    # Assuming entry is pickled transaction/block
+                    entry = pickle.loads(decoded)
+                    self.ledger.append(entry)
+                    if isinstance(entry, dict) and 'hash' in entry:
+                        self.by_hash[entry['hash']] = entry
+                    added += 1
+                except Exception:
+                    continue
+            self._offset += end
+            return added
     
     def write(self, entry):
-        import base64
-        import pickle
-        
         # Serialize and encode
         serialized = pickle.dumps(entry)
         encoded = base64.b64encode(serialized)
         
-        file = open(self.db_path, 'ab')
-        file.write(encoded)
-        file.write(self.sep)
-        file.close()
-        
-        self.ledger.append(entry)
+        with self._lock:
+            file = open(self.db_path, 'ab')
+            file.write(encoded + self.sep)
+            file.close()
+            # Picks up our entry, plus anything another process appended before it
+            self.refresh()
 
     def get_last_entry(self):
         if self.ledger:
             return self.ledger[-1]
         return None
 
+    def get_block(self, hash_):
+        # Block by hash, or None
+        return self.by_hash.get(hash_)
+
+    # --- Sync ---
+    def height(self):
+        return len(self.ledger)
+
+    def tip(self):
+        # (height, hash of the last block); an empty ledger has the genesis prev hash
+        with self._lock:
+            last = self.get_last_entry()
+            return len(self.ledger), last.get('hash', GENESIS_PREV_HASH) if last else GENESIS_PREV_HASH
+
+    def get_blocks(self, from_height, max_bytes):
+        """
+        Blocks from position from_height onwards, as json strings, stopping before their
+        total size passes max_bytes (at least one block is returned if any are left).
+        """
+        with self._lock:
+            blocks = self.ledger[from_height:]
+        out = []
+        size = 0
+        for block in blocks:
+            encoded = json.dumps(block, default=str)
+            if out and size + len(encoded) > max_bytes:
+                break
+            out.append(encoded)
+            size += len(encoded)
+        return out
+
+    def append_blocks(self, blocks):
+        """
+        Append blocks, in order. Each one must extend the current tip (its prev_hash is our
+        last hash) and its hash must match its contents. PoD confirmations are not checked here:
+        blocks from peers go through ingest.BlockIngest, which verifies them before calling this.
+        Raises ValueError on the first block that does not fit; earlier ones stay written.
+        """
+        with self._lock:
+            for block in blocks:
+                _, tip_hash = self.tip()
+                if block.get('prev_hash') != tip_hash:
+                    raise ValueError(f"Block {block.get('index')} does not extend our tip {tip_hash[:16]}")
+                if block_hash(block) != block.get('hash'):
+                    raise ValueError(f"Block {block.get('index')} hash does not match its contents")
+                self.write(block)
+        return len(blocks)
+
+
+def block_hash(block):
+    # Same construction as the miner: sha256 of prev_hash:merkle_root:index, merkle_root over the transactions
+    tx_data = json.dumps(block.get('transactions', []), sort_keys=True, default=str)
+    merkle_root = hashlib.sha256(tx_data.encode('utf-8')).hexdigest()
+    if merkle_root != block.get('merkle_root'):
+        return None
+    return hashlib.sha256(f"{block.get('prev_hash')}:{merkle_root}:{block.get('index')}".encode('utf-8')).hexdigest()
+
 if __name__ == "__main__":
     ledger = Ledger()
     print(f"Ledger loaded with {len(ledger.ledger)} entries")
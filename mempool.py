@@ -1,20 +1,75 @@
 # Copyright (c) 2025 Nikola Tesla
 # Memory Pool (Mempool) for storing unconfirmed transactions
 # It will be a very basic text file for storing all these data
+import os
 import pickle
 import json
 import io
+import time
+import hashlib
+import datetime
+from ixan import get_registry
+from account import verify_signature, public_key_from_identity, SIG_LEGACY
+
+TIME_FORMAT = '%d/%m/%Y, %H:%M:%S'
+
+
+class ParsedTx:
+    """
+    A transaction parsed once, at admission, from its XMIF dict ({'mc', 'signature', 'sig_version'}).
+    The mempool, the miner and PoD read these fields instead of re-splitting the mc string.
+    """
+    __slots__ = ('mc', 'signature', 'sig_version', 'sender', 'recipient', 'amount', 'currency',
+                 'owner', 'fees', 'time', 'timestamp', 'hash')
+
+    def __init__(self, mc, signature, sig_version=SIG_LEGACY):
+        self.mc = mc
+        self.signature = signature
+        self.sig_version = sig_version
+        sender, recipient, money, time_str, fees = mc.split('|')
+        money = json.loads(money)
+        currency = money.get('currency')
+        self.sender = sender
+        self.recipient = recipient
+        self.amount = float(money.get('amount', 0))
+        # Transaction stores the default currency as a 1-tuple, which json turns into a list
+        self.currency = currency[0] if isinstance(currency, list) and currency else currency
+        self.owner = money.get('owner')
+        self.fees = float(fees)
+        self.time = time_str
+        # The mc time is the signer's local wall-clock time (Transaction uses datetime.now()), so read it as local time
+        self.timestamp = int(time.mktime(datetime.datetime.strptime(time_str, TIME_FORMAT).timetuple()))
+        self.hash = hashlib.sha256(mc.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_xmif(cls, xmif):
+        return cls(xmif['mc'], xmif['signature'], xmif.get('sig_version', SIG_LEGACY))
+
+    def to_xmif(self):
+        # The wire/ledger form of the transaction
+        return {'mc': self.mc, 'signature': self.signature, 'sig_version': self.sig_version}
+
+    def __repr__(self):
+        return f"ParsedTx({self.sender} -> {self.recipient}: {self.amount} {self.currency}, {self.hash[:12]})"
+
 
 class Mempool:
-    def __init__(self):
+    def __init__(self, db_path='./db/mempool.bin', registry_path='./db/ixan.db'):
         self.sep = b'\n'
+        self.db_path = db_path
+        self.registry_path = registry_path # IXAN registry used to resolve senders
+        self._public_keys = {} # identity -> imported public key
+        self.by_sender = {} # sender IXAN -> pending transactions
+        self.by_hash = {} # transaction hash -> pending transaction
         self.mempool = self.load_mempool()
+        for tx in self.mempool:
+            self._index(tx)
         
     def load_mempool(self):
         mempool = list()
         import base64
         try:
-            file = open('./db/mempool.bin', 'rb')
+            file = open(self.db_path, 'rb')
             content = file.read()
             file.close()
         except OSError:
@@ -35,35 +90,107 @@ class Mempool:
     
     def parse_tx(self, tx_data):
         tx = pickle.loads(tx_data)
-        # Create an new dictionary for the mc
-        mc = {}
-        # Seperate the transaction into it's microformat and it's signature
-        mcx = tx['mc']
-        signature = tx['signature']
-        # Then further seperate the mc
-        array = mcx.split('|')
-        # Add it into the database
-        mc['sender'] = array[0]
-        mc['recipient'] = array[1]
-        mc['money'] = json.loads(array[2]) # Make it an array
-        mc['time'] = array[3]
-        mc['fees'] = array[4]
-        mc['signature'] = signature
-        return mc
+        return ParsedTx.from_xmif(tx)
+
+    def verify_tx(self, tx):
+        # Check the signature against the sender's registered identity, by scheme version
+        if not isinstance(tx, ParsedTx):
+            tx = ParsedTx.from_xmif(tx)
+        identity = self.get_sender_identity(tx.sender)
+        if identity is None:
+            return False
+        if identity not in self._public_keys:
+            self._public_keys[identity] = public_key_from_identity(identity)
+        return verify_signature(self._public_keys[identity], tx.mc, tx.signature, tx.sig_version)
     
     def store_tx(self, tranx):
+        self.store_many([tranx])
+
+    def store_many(self, tranxs):
+        """
+        Admit several transactions with a single append to the mempool file.
+        Every signature is checked first; if one fails nothing is written.
+        """
         import base64
-        file = open('./db/mempool.bin', 'ab')
-        ## Serialize the data
-        t = pickle.dumps(tranx)
-        ## Base64 encode
-        t_b64 = base64.b64encode(t)
+        # Parse once; the parsed objects are what the mempool keeps
+        parsed = [ParsedTx.from_xmif(tranx) for tranx in tranxs]
+        for tx in parsed:
+            if not self.verify_tx(tx):
+                raise ValueError("Transaction rejected: bad signature or unknown sender")
+        ## Serialize the data, base64 encode, one line per transaction
+        lines = b''.join(base64.b64encode(pickle.dumps(tx.to_xmif())) + self.sep for tx in parsed)
         ## Write it to the file
-        file.write(t_b64)
-        file.write(self.sep)
+        file = open(self.db_path, 'ab')
+        file.write(lines)
         # Close the file handle
         file.close()
         ## Add the mempool
-        tx = self.parse_tx(t)
-        self.mempool.append(tx)
+        for tx in parsed:
+            self.mempool.append(tx)
+            self._index(tx)
+
+    def remove(self, tx_hashes):
+        """
+        Drop transactions by hash (e.g. once a block has them) from memory and from the file.
+        The file is rewritten from its current content, so transactions another process appended
+        since we loaded it are kept. Returns the number of pending transactions removed.
+        """
+        import base64
+        drop = set(tx_hashes)
+        removed = [self.by_hash.pop(h) for h in drop if h in self.by_hash]
+        if removed:
+            self.mempool = [tx for tx in self.mempool if tx.hash not in drop]
+            for sender in {tx.sender for tx in removed}:
+                pending = [tx for tx in self.by_sender.get(sender, []) if tx.hash not in drop]
+                if pending:
+                    self.by_sender[sender] = pending
+                else:
+                    self.by_sender.pop(sender, None)
+        try:
+            file = open(self.db_path, 'rb')
+            content = file.read()
+            file.close()
+        except OSError:
+            return len(removed)
+        kept = []
+        for line in content.split(self.sep):
+            if len(line) < 1:
+                continue
+            try:
+                mc = pickle.loads(base64.b64decode(line))['mc']
+            except Exception:
+                continue
+            if hashlib.sha256(mc.encode('utf-8')).hexdigest() not in drop:
+                kept.append(line + self.sep)
+        # Write the compacted file next to the old one and swap it in
+        tmp_path = self.db_path + '.tmp'
+        file = open(tmp_path, 'wb')
+        file.write(b''.join(kept))
+        file.close()
+        os.replace(tmp_path, self.db_path)
+        return len(removed)
+
+    def clear(self):
+        # Empty the file and every in-memory view of it
+        open(self.db_path, 'wb').close()
+        self.mempool = []
+        self.by_sender = {}
+        self.by_hash = {}
+
+    def _index(self, tx):
+        self.by_sender.setdefault(tx.sender, []).append(tx)
+        self.by_hash[tx.hash] = tx
+
+    def get_tx(self, tx_hash):
+        # Pending transaction by hash, or None
+        return self.by_hash.get(tx_hash)
+
+    def get_sender_txs(self, ixan):
+        # Pending transactions of one sender
+        return self.by_sender.get(ixan, [])
+
+    def get_sender_identity(self, ixan):
+        # Resolve a sender IXAN to its public identity through the IXAN registry (replicated
+        # between nodes, see NodeManager.sync_ixans_from)
+        return get_registry(self.registry_path).lookup(ixan)
 
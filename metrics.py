@@ -0,0 +1,249 @@
+# Copyright (c) 2025 Nikola Tesla
+# Node and miner metrics
+# Counters, gauges and latency histograms, served as a Prometheus text page (/metrics) on a local port
+# - instrument_handler() wraps every NodeRPCHandler RPC method: call counts by outcome, latency
+#   histograms per method and HMAC failures by reason
+# - XML-RPC body bytes in and out, served and called (RPCConnectionPool.on_bytes, server on_bytes)
+# - Gauges read live values (peer count, ledger height, mempool size) when scraped
+# - miner.py runs in its own process and serves its own page: hashrate, PoD hashes and blocks mined
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Gauge:
+    # Value read from a callable at scrape time; the callable returns a number or {label tuple: number}
+    # kind="counter" for running totals kept elsewhere (e.g. a stats dict)
+    def __init__(self, name, help_text, read, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.read()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for values, v in sorted(value.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {v}")
+        elif value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, prefix="xbucks_", rpc=True):
+        """rpc: register the RPC server metrics (False for processes that serve no RPC, like the miner)"""
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.loop_latency = self.histogram("loop_round_seconds", "Duration of one round of a node or miner loop", ("loop",))
+        self.loop_errors = self.counter("loop_errors_total", "Failed rounds of a node or miner loop", ("loop",))
+        if not rpc:
+            return
+        self.rpc_calls = self.counter("rpc_calls_total", "RPC calls handled, by method and outcome", ("method", "outcome"))
+        self.rpc_latency = self.histogram("rpc_latency_seconds", "RPC handling time, by method", ("method",))
+        self.rpc_bytes = self.counter("rpc_bytes_total", "XML-RPC body bytes, as server or client, in or out", ("side", "direction"))
+        self.hmac_failures = self.counter("hmac_failures_total", "RPC requests refused by the HMAC/timestamp check", ("reason",))
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(self.prefix + name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, labels=(), kind="gauge"):
+        return self._add(Gauge(self.prefix + name, help_text, read, labels, kind))
+
+    def timed(self, loop):
+        """Context manager timing one round of a loop: with metrics.timed("announce"): ..."""
+        return _Timer(self, loop)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    def __init__(self, metrics, loop):
+        self.metrics = metrics
+        self.loop = loop
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.loop_latency.observe(time.perf_counter() - self.start, self.loop)
+        if exc_type is not None:
+            self.metrics.loop_errors.inc(self.loop)
+        return False
+
+
+def instrument_handler(handler, metrics):
+    """
+    Wrap the public methods of an RPC handler instance (in place) so every call is counted and timed.
+    Outcome is "ok", "refused" (a {"success": False} reply), "fault" or "error".
+    The signature check is wrapped too, counting HMAC failures by reason.
+    """
+    check = handler._check_time_and_signature
+
+    def checked(*args, **kwargs):
+        ok, reason = check(*args, **kwargs)
+        if not ok:
+            metrics.hmac_failures.inc(reason)
+        return ok, reason
+
+    handler._check_time_and_signature = checked
+
+    for name in dir(handler):
+        if name.startswith("_"):
+            continue
+        method = getattr(handler, name)
+        if not callable(method):
+            continue
+        setattr(handler, name, _wrap(name, method, metrics))
+    return handler
+
+
+def _wrap(name, method, metrics):
+    from xmlrpc.client import Fault
+
+    def call(*args):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            result = method(*args)
+            if isinstance(result, dict) and result.get("success") is False:
+                outcome = "refused"
+            return result
+        except Fault:
+            outcome = "fault"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.rpc_latency.observe(time.perf_counter() - start, name)
+            metrics.rpc_calls.inc(name, outcome)
+
+    call.__name__ = name
+    call.__doc__ = method.__doc__
+    return call
+
+
+class MetricsServer:
+    """Serves metrics.render() at /metrics from a background thread."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9100):
+        self.metrics = metrics
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = owner.metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,270 @@
+# Copyright (c) 2025 Nikola Tesla
+# Binary microformat
+# A compact, versioned byte encoding of the transaction microformat (mc) string
+#   sender|receiver|{"amount": "...", "currency": ..., "owner": "..."}|dd/mm/YYYY, HH:MM:SS|fees
+# IXANs are packed into 5 bytes, amounts become integer minor units with a decimal exponent,
+# currencies become one byte from a code table and the timestamp is stored as seconds since 1970 of its
+# wall-clock fields, read as UTC whatever the signer's zone was (so it decodes back to the same string).
+# Conversion is lossless: anything the compact layout cannot reproduce exactly is stored raw.
+
+import json
+import struct
+import calendar
+import datetime
+from decimal import Decimal, InvalidOperation
+
+FORMAT_RAW = 0 # UTF-8 mc string as-is
+FORMAT_COMPACT = 1
+
+TIME_FORMAT = '%d/%m/%Y, %H:%M:%S'
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Currency code table; 0 means "spelled out"
+CURRENCY_CODES = ['NGN', 'USD', 'ZAR', 'USDT', 'EUR', 'GBP', 'BTC', 'ETH']
+
+# Flag bits
+SENDER_IXAN = 0x01
+RECEIVER_IXAN = 0x02
+OWNER_IS_SENDER = 0x04
+OWNER_IXAN = 0x08
+CURRENCY_IN_LIST = 0x10 # Transaction stores AccountManager.get_default(), a 1-tuple, which json turns into a list
+
+
+# ----------------- Field codecs -----------------
+def _put_varint(out, n):
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+def _put_bytes(out, b):
+    _put_varint(out, len(b))
+    out += b
+
+def _get_bytes(data, pos):
+    n, pos = _get_varint(data, pos)
+    return bytes(data[pos:pos + n]), pos + n
+
+def _is_packable_ixan(value):
+    return len(value) == 12 and value.isdigit()
+
+def _put_id(out, value, packed):
+    if packed:
+        out += int(value).to_bytes(5, 'big') # 10^12 < 2^40
+    else:
+        _put_bytes(out, value.encode('utf-8'))
+
+def _get_id(data, pos, packed):
+    if packed:
+        return str(int.from_bytes(data[pos:pos + 5], 'big')).zfill(12), pos + 5
+    raw, pos = _get_bytes(data, pos)
+    return raw.decode('utf-8'), pos
+
+def _put_amount(out, text):
+    # Decimal string -> (integer minor units, exponent), e.g. "1000.50" -> (100050, -2)
+    sign, digits, exponent = Decimal(text).as_tuple()
+    if not isinstance(exponent, int) or not -128 <= exponent <= 127:
+        raise ValueError(f"Unsupported amount {text!r}")
+    units = int(''.join(map(str, digits)))
+    _put_varint(out, (units << 1) | sign) # sign in the low bit
+    out += struct.pack('>b', exponent)
+
+def _get_units(data, pos):
+    # -> (signed integer minor units, exponent, new position)
+    n, pos = _get_varint(data, pos)
+    units = -(n >> 1) if n & 1 else n >> 1
+    return units, struct.unpack_from('>b', data, pos)[0], pos + 1
+
+def _get_amount(data, pos):
+    n, pos = _get_varint(data, pos)
+    exponent = struct.unpack_from('>b', data, pos)[0]
+    units = str(n >> 1)
+    if exponent == 0 and not n & 1:
+        return units, pos + 1
+    if -len(units) - 5 <= exponent < 0 and not n & 1:
+        # Plain notation, same as str(Decimal) gives for these exponents
+        units = units.zfill(1 - exponent)
+        return units[:exponent] + '.' + units[exponent:], pos + 1
+    digits = tuple(int(c) for c in units)
+    return str(Decimal((n & 1, digits, exponent))), pos + 1
+
+
+# ----------------- Public API -----------------
+def encode_mc(mc):
+    """Encode an mc string to bytes. decode_mc(encode_mc(mc)) == mc for any mc."""
+    try:
+        data = _encode_compact(mc)
+        if decode_mc(data) == mc:
+            return data
+    except (ValueError, TypeError, KeyError, IndexError, InvalidOperation, OverflowError):
+        pass
+    return bytes([FORMAT_RAW]) + mc.encode('utf-8')
+
+def _encode_compact(mc):
+    sender, receiver, money_json, time_str, fees = mc.split('|')
+    money = json.loads(money_json)
+    if list(money) != ['amount', 'currency', 'owner']:
+        raise ValueError("Unexpected money format")
+    currency, owner = money['currency'], money['owner']
+
+    flags = 0
+    if _is_packable_ixan(sender): flags |= SENDER_IXAN
+    if _is_packable_ixan(receiver): flags |= RECEIVER_IXAN
+    if owner == sender: flags |= OWNER_IS_SENDER
+    elif _is_packable_ixan(owner): flags |= OWNER_IXAN
+    if isinstance(currency, list) and len(currency) == 1:
+        flags |= CURRENCY_IN_LIST
+        currency = currency[0]
+    if not isinstance(currency, str):
+        raise ValueError("Unexpected currency format")
+
+    out = bytearray([FORMAT_COMPACT, flags])
+    _put_id(out, sender, flags & SENDER_IXAN)
+    _put_id(out, receiver, flags & RECEIVER_IXAN)
+    if not flags & OWNER_IS_SENDER:
+        _put_id(out, owner, flags & OWNER_IXAN)
+    if currency in CURRENCY_CODES:
+        out.append(CURRENCY_CODES.index(currency) + 1)
+    else:
+        out.append(0)
+        _put_bytes(out, currency.encode('utf-8'))
+    _put_amount(out, money['amount'])
+    when = datetime.datetime.strptime(time_str, TIME_FORMAT)
+    out += struct.pack('>q', calendar.timegm(when.timetuple()))
+    _put_amount(out, fees)
+    return bytes(out)
+
+def decode_fields(data):
+    """
+    Decode bytes straight to transaction fields, without rebuilding the mc string.
+    Returns a dict of the mc fields: sender, recipient, money (the parsed json), time, fees.
+    (Mempool.parse_tx returns a ParsedTx with flattened amount/currency/owner instead.)
+    """
+    if data[0] == FORMAT_RAW:
+        sender, recipient, money, time_str, fees = data[1:].decode('utf-8').split('|')
+        return {'sender': sender, 'recipient': recipient, 'money': json.loads(money), 'time': time_str, 'fees': fees}
+    if data[0] != FORMAT_COMPACT:
+        raise ValueError(f"Unknown microformat version {data[0]}")
+
+    flags = data[1]
+    sender, pos = _get_id(data, 2, flags & SENDER_IXAN)
+    recipient, pos = _get_id(data, pos, flags & RECEIVER_IXAN)
+    if flags & OWNER_IS_SENDER:
+        owner = sender
+    else:
+        owner, pos = _get_id(data, pos, flags & OWNER_IXAN)
+    code = data[pos]
+    pos += 1
+    if code:
+        currency = CURRENCY_CODES[code - 1]
+    else:
+        raw, pos = _get_bytes(data, pos)
+        currency = raw.decode('utf-8')
+    if flags & CURRENCY_IN_LIST:
+        currency = [currency]
+    amount, pos = _get_amount(data, pos)
+    seconds = struct.unpack_from('>q', data, pos)[0]
+    time_str = (EPOCH + datetime.timedelta(seconds=seconds)).strftime(TIME_FORMAT)
+    fees, pos = _get_amount(data, pos + 8)
+    money = {'amount': amount, 'currency': currency, 'owner': owner}
+    return {'sender': sender, 'recipient': recipient, 'money': money, 'time': time_str, 'fees': fees}
+
+def unpack(data):
+    """
+    Decode bytes to ready-to-use values, skipping all string reconstruction:
+    (sender, recipient, owner, currency, amount, timestamp, fees) with amount and
+    fees as floats and timestamp as the packed wall-clock seconds (see the module header; for a true
+    epoch use ParsedTx.timestamp, which reads the mc time as local time).
+    """
+    if data[0] != FORMAT_COMPACT:
+        f = decode_fields(data)
+        currency = f['money']['currency']
+        when = datetime.datetime.strptime(f['time'], TIME_FORMAT)
+        return (f['sender'], f['recipient'], f['money']['owner'], currency[0] if isinstance(currency, list) else currency,
+                float(f['money']['amount']), calendar.timegm(when.timetuple()), float(f['fees']))
+    flags = data[1]
+    sender, pos = _get_id(data, 2, flags & SENDER_IXAN)
+    recipient, pos = _get_id(data, pos, flags & RECEIVER_IXAN)
+    if flags & OWNER_IS_SENDER:
+        owner = sender
+    else:
+        owner, pos = _get_id(data, pos, flags & OWNER_IXAN)
+    code = data[pos]
+    pos += 1
+    if code:
+        currency = CURRENCY_CODES[code - 1]
+    else:
+        raw, pos = _get_bytes(data, pos)
+        currency = raw.decode('utf-8')
+    units, exponent, pos = _get_units(data, pos)
+    timestamp = struct.unpack_from('>q', data, pos)[0]
+    fee_units, fee_exponent, pos = _get_units(data, pos + 8)
+    return sender, recipient, owner, currency, _to_float(units, exponent), timestamp, _to_float(fee_units, fee_exponent)
+
+def _to_float(units, exponent):
+    # Divide by an exact power of ten so e.g. 2505e-1 comes out as exactly 250.5
+    return units / 10 ** -exponent if exponent < 0 else float(units * 10 ** exponent)
+
+def decode_mc(data):
+    """Decode bytes produced by encode_mc back to the mc string."""
+    if data[0] == FORMAT_RAW:
+        return data[1:].decode('utf-8')
+    f = decode_fields(data)
+    return '|'.join([f['sender'], f['recipient'], json.dumps(f['money']), f['time'], f['fees']])
+
+
+# ----------------- Benchmark -----------------
+def benchmark(n=20000):
+    import time
+    import random
+    samples = []
+    for i in range(n):
+        sender = str(random.randrange(10 ** 12)).zfill(12)
+        receiver = str(random.randrange(10 ** 12)).zfill(12)
+        money = {'amount': str(random.choice([1000, 250.5, 0.0001, 73])), 'currency': [random.choice(CURRENCY_CODES)], 'owner': sender}
+        when = datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=random.randrange(10 ** 8))
+        samples.append('|'.join([sender, receiver, json.dumps(money), when.strftime(TIME_FORMAT), str(random.choice([0.0001, 10, 0.5]))]))
+
+    encoded = [encode_mc(mc) for mc in samples]
+    assert all(decode_mc(b) == mc for b, mc in zip(encoded, samples))
+    text_size = sum(len(mc.encode('utf-8')) for mc in samples) / n
+    binary_size = sum(len(b) for b in encoded) / n
+
+    # Parse to usable values: numeric amount/fees and an epoch timestamp
+    start = time.perf_counter()
+    for mc in samples:
+        sender, recipient, money, time_str, fees = mc.split('|')
+        money = json.loads(money)
+        float(money['amount']), float(fees)
+        calendar.timegm(datetime.datetime.strptime(time_str, TIME_FORMAT).timetuple())
+    text_parse = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for b in encoded:
+        unpack(b)
+    binary_parse = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for b in encoded:
+        decode_mc(b)
+    to_text = (time.perf_counter() - start) / n * 1e6
+
+    print(f"Size:  text {text_size:.1f} B, binary {binary_size:.1f} B ({binary_size / text_size:.0%})")
+    print(f"Parse: text {text_parse:.2f} us/tx, binary {binary_parse:.2f} us/tx")
+    print(f"Binary -> mc string: {to_text:.2f} us/tx")
+
+
+if __name__ == "__main__":
+    benchmark()
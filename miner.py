@@ -4,32 +4,81 @@ import json
 
 from mempool import Mempool
 from ledger import Ledger
-from account import Account
+from account import keyring
+from metrics import Metrics, MetricsServer
+import hashcash
 import hashlib
 
+# The miner runs as its own process, next to the node (whose metrics are on 9100)
+MINER_METRICS_PORT = 9101
+
 class Miner:
-    def __init__(self, account_passphrase, account_name="default", difficulty=10, pod_k=40, pod_diff=16):
-        self.account = Account(account_passphrase, account_name=account_name)
-        self.mempool = Mempool()
-        self.ledger = Ledger()
+    def __init__(self, account_passphrase, account_name="default", difficulty=10, pod_k=40, pod_diff=16,
+                 mempool=None, ledger=None):
+        # mempool / ledger: mine from and into these (e.g. a node's own, see cluster.py) instead of the default files
+        self.account = keyring.get(account_passphrase, account_name=account_name)
+        self._own_mempool = mempool is None
+        self.mempool = mempool if mempool is not None else Mempool()
+        self.ledger = ledger if ledger is not None else Ledger()
         self.difficulty = difficulty # legacy field, ignored
         self.pod_k = pod_k
         self.pod_diff = pod_diff
+        # Hashrate and work of this process (hashcash.MINER_STATS), served by start_metrics
+        self.metrics = Metrics(rpc=False)
+        self.metrics_server = None
+        self.blocks = self.metrics.counter("miner_blocks_total", "Mining rounds, by outcome", ("outcome",))
+        self.metrics.gauge("miner_hashrate", "Hashes per second of the last PoD puzzle solved",
+                           lambda: hashcash.MINER_STATS["last_hashrate"])
+        self.metrics.gauge("miner_hashes_total", "PoD hashes computed", lambda: hashcash.MINER_STATS["hashes"],
+                           kind="counter")
+
+    def start_metrics(self, host="127.0.0.1", port=MINER_METRICS_PORT):
+        self.metrics_server = MetricsServer(self.metrics, host, port).start()
+        print(f"Miner metrics on http://{host}:{port}/metrics")
+        return self.metrics_server
+
+    def run(self, interval_seconds=10):
+        # Mine whatever is pending every interval_seconds, until interrupted
+        while True:
+            with self.metrics.timed("mine"):
+                self.mine_block()
+            time.sleep(interval_seconds)
 
     def mine_block(self):
         print("Miner: Checking Mempool...")
-        from hashcash import get_pod_engine
-        pod = get_pod_engine(k_factor=self.pod_k, base_difficulty=self.pod_diff)
 
         # Reload mempool to get latest
-        self.mempool = Mempool() 
+        if self._own_mempool:
+            self.mempool = Mempool() 
         txs = self.mempool.mempool
         
         if not txs:
             print("Miner: No transactions to mine.")
+            self.blocks.inc("empty")
+            return None
+
+        block, total_amount = self.build_block(txs)
+        if not self.confirm(block, total_amount):
+            self.blocks.inc("failed")
             return None
 
-        # Create Block payload
+        # Save to Ledger
+        self.ledger.write(block)
+        print("Miner: Block saved to Ledger.")
+        self.blocks.inc("mined")
+        
+        # Clear Mempool
+        self.clear_mempool()
+        
+        return block
+
+    def build_block(self, txs):
+        """
+        Unconfirmed block of txs (ParsedTx) on top of our ledger's last entry.
+        Returns (block, total amount) - the amount sets how many confirmations it needs.
+        """
+        # Create Block payload on the latest tip (the node may have appended blocks since we loaded the ledger)
+        self.ledger.refresh()
         last_entry = self.ledger.get_last_entry()
         if last_entry:
             prev_hash = last_entry.get('hash', '0'*64)
@@ -38,28 +87,15 @@ class Miner:
             prev_hash = '0'*64
             index = 1
 
-        # Calculate Total Amount for N
-        total_amount = 0
-        try:
-            for tx in txs:
-                if 'mc' in tx:
-                    # Parse MC: owner|receiver|money_json|...
-                    parts = tx['mc'].split('|')
-                    if len(parts) > 2:
-                        # Find the part that looks like json
-                        for p in parts:
-                            if p.strip().startswith('{') and '"amount":' in p:
-                                try:
-                                    money = json.loads(p)
-                                    total_amount += float(money.get('amount', 0))
-                                except: pass
-        except Exception as e:
-            print(f"Miner warning: could not parse amount: {e}")
-            total_amount = 1
+        # Calculate Total Amount for N (already parsed by the mempool)
+        total_amount = sum(tx.amount for tx in txs)
         
         if total_amount == 0: total_amount = 1 # Fallback
         print(f"Miner: Total amount in block: {total_amount}")
 
+        # Blocks carry transactions in their XMIF form
+        txs = [tx.to_xmif() for tx in txs]
+
         # Fingerprint of transactions
         tx_data = json.dumps(txs, sort_keys=True, default=str)
         tx_fingerprint = hashlib.sha256(tx_data.encode('utf-8')).hexdigest()
@@ -75,28 +111,39 @@ class Miner:
             'merkle_root': tx_fingerprint,
             'hash': block_hash # The ID of the block we are confirming
         }
-        
-        print(f"Miner: Starting PoD Mining for Block {index} (Value: {total_amount})...")
+        return block, total_amount
+
+    def confirm(self, block, total_amount, validators=None):
+        """
+        Add PoD confirmations to block until it has enough.
+        validators: identities that solve the puzzles in turn (default: only this miner's, whose
+        difficulty grows with every confirmation it adds). Returns False if a puzzle went unsolved.
+        """
+        from hashcash import get_pod_engine
+        pod = get_pod_engine(k_factor=self.pod_k, base_difficulty=self.pod_diff)
+        validators = validators or [self.account.identity()]
+        print(f"Miner: Starting PoD Mining for Block {block['index']} (Value: {total_amount})...")
         
         # Mine until N reached
         while True:
-            is_valid, n_req = pod.check_block_status(block)
+            is_valid, n_req = pod.check_block_status(block, amount=total_amount)
             if is_valid:
                 print(f"Miner: Block fully confirmed ({len(block['confirmations'])}/{n_req}).")
-                break
+                return True
                 
             print(f"Miner: Need confirmation {len(block['confirmations'])+1}/{n_req}...")
+            validator = validators[len(block['confirmations']) % len(validators)]
             
-            # Calculate difficulty for ME (this validator)
-            diff = pod.calculate_difficulty(block, self.account.identity())
+            # Calculate difficulty for this validator
+            diff = pod.calculate_difficulty(block, validator)
             
             # Solve
-            nonce, conf_hash, ts_ms = pod.solve_puzzle(block['hash'], self.account.identity(), diff)
+            nonce, conf_hash, ts_ms = pod.solve_puzzle(block['hash'], validator, diff)
             
             if nonce is not None:
                 print(f"Miner: Solved puzzle (diff {diff})! Nonce: {nonce}")
                 conf = {
-                    'validator': self.account.identity(),
+                    'validator': validator,
                     'nonce': nonce,
                     'difficulty': diff,
                     'timestamp': ts_ms,
@@ -105,27 +152,26 @@ class Miner:
                 block['confirmations'].append(conf)
             else:
                 print("Miner: Failed to solve puzzle.")
-                return None
-
-        # Save to Ledger
-        self.ledger.write(block)
-        print("Miner: Block saved to Ledger.")
-        
-        # Clear Mempool
-        self.clear_mempool()
-        
-        return block
+                return False
 
     def clear_mempool(self):
         # Nuke it for now
         print("Miner: Clearing Mempool...")
         try:
-             open('./db/mempool.bin', 'wb').close()
-             self.mempool.mempool = []
+             self.mempool.clear()
         except:
             pass
 
 if __name__ == "__main__":
+    import sys
     # Test Miner
+    # python miner.py [metrics_port]: with a port, keep mining and serve /metrics on it
     miner = Miner(account_passphrase="miner_pass", account_name="miner1", difficulty=12)
-    miner.mine_block()
+    if len(sys.argv) > 1:
+        miner.start_metrics(port=int(sys.argv[1]))
+        try:
+            miner.run()
+        except KeyboardInterrupt:
+            pass
+    else:
+        miner.mine_block()
@@ -6,16 +6,40 @@
 Extended node using XML-RPC + HMAC authentication + configurable roaming discovery.
 
 Key features (added / modified):
-- XML-RPC server (threaded) as the main RPC endpoint.
+- XML-RPC server as the main RPC endpoint: threaded, or asyncio (async_node.py) with CONFIG["server_mode"] = "async".
 - RPC methods:
     - announce(host, port, timestamp, nonce, signature): announce peer
     - get_state(timestamp, nonce, signature): request node state (returns xml string)
+    - get_state_if_changed(etag, timestamp, nonce, signature): node state only if its etag differs from ours
     - get_ledger(timestamp, nonce, signature): request ledger xml string
+    - get_chain_tip(timestamp, nonce, signature): ledger height and last block hash (json)
+    - get_blocks("from_height:max_bytes", timestamp, nonce, signature): a size-bounded chunk of blocks (json)
     - send_state(xml_payload, timestamp, nonce, signature): push state to this node
     - send_ledger(xml_payload, timestamp, nonce, signature): push ledger to this node
+    - get_dns_changes(since_version, timestamp, nonce, signature): DNS records changed after a version (json)
+    - get_ixan_changes(since_version, timestamp, nonce, signature): IXAN registry entries added after a version (json)
+    - gossip_inv(json_payload, timestamp, nonce, signature): inventory of transaction / block hashes a peer has
+    - gossip_getdata(json_payload, timestamp, nonce, signature): fetch announced items by hash (json)
+    - get_block_txs(json_payload, timestamp, nonce, signature): transactions of a block by position (json)
 - HMAC-SHA256 signature verification for RPC calls (shared secret).
-- Configurable roaming discovery with a subnet base and explicit list/range of ports.
-- SQLite peer DB, and saving STATE/LEDGER to files under ./db/.
+- Configurable roaming discovery with a subnet base and explicit list/range of ports: every host:port is
+  probed concurrently (bounded), known peers first, and endpoints that did not answer are skipped
+  with exponential backoff.
+- In-memory peer table ranked by RTT and failures, written behind to SQLite in batches, and saving STATE/LEDGER to files under ./db/.
+- Incremental ledger sync: a node behind its peer pulls only the missing blocks, chunk by chunk,
+  resuming from its own height after an interruption.
+- Epidemic gossip of new transactions and blocks (gossip.py): hashes are announced to a few random peers
+  among the best ranked, which pull what they miss and announce it onwards. Blocks travel as compact blocks (compactblock.py)
+  and are rebuilt from the local mempool.
+- Incremental DNS replication: each node periodically pulls only the records its peers changed since the last pull.
+- IXAN registry replication, the same way: transactions are verified against the key their sender registered
+  on any node, so the registry has to be on every node.
+- Metrics (metrics.py): per-RPC call counts and latency histograms, HMAC failures, loop timings, peer count,
+  ledger height and mempool size as a Prometheus text page on a local port. The miner (miner.py) runs in
+  its own process and serves its hashrate on a page of its own.
+  XML-RPC bytes in and out are counted too, as server and as client.
+- NodeManager(..., db_dir=...) keeps a node's files in its own directory; cluster.py runs many nodes on
+  127.0.0.1 and measures propagation latency, bandwidth per node and ledger convergence.
 - Graceful shutdown on SIGINT.
 """
 
@@ -29,6 +53,9 @@ import random
 import xml.etree.ElementTree as ET
 import hmac
 import hashlib
+import http.client
+import socket
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 from xmlrpc.client import ServerProxy, Transport, Fault, ProtocolError
@@ -41,12 +68,19 @@ CONFIG = {
     # Node listening address
     "host": "127.0.0.1",
     "port": 9999,  # XML-RPC server port
+    "server_mode": "threaded",  # "threaded" (thread per connection) or "async" (one event loop, see async_node.py)
+    "async_max_concurrency": 64,  # handler calls in flight at once (async mode)
+    "async_max_connections": 1024,  # open connections served at once (async mode)
 
     # Discovery/roaming
     "roam_subnet_base": "192.168.1.",  # change to "192.168.1." for LAN scanning (be careful)
     # ports can be explicitly listed or a range tuple (start, end)
     "roam_ports": list(range(9900, 9910)),  # example explicit list
-    "roam_interval_seconds": 3.0,  # average delay between probes
+    "roam_scan_interval_seconds": 60.0,  # pause between full scans of the subnet
+    "roam_max_in_flight": 64,  # probes running at once
+    "roam_probe_timeout": 1.0,  # seconds to connect / answer a ping
+    "roam_dead_ttl_seconds": 60.0,  # first backoff for an endpoint that did not answer; doubles per miss
+    "roam_max_dead_ttl_seconds": 3600.0,
 
     # Security
     "hmac_secret": "supersecret_shared_key",  # Change to a secure secret on all nodes
@@ -57,6 +91,33 @@ CONFIG = {
     "state_file": "./db/state.data",
     "ledger_file": "./db/ledger.data",
     "db_file": "./db/peers.db",
+    "dns_file": "./db/dns.db",
+    "ixan_file": "./db/ixan.db",
+
+    # DNS replication
+    "dns_sync_interval_seconds": 60,
+    "dns_sync_batch": 500,  # max records per get_dns_changes reply
+
+    # IXAN registry replication
+    "ixan_sync_interval_seconds": 60,
+    "ixan_sync_batch": 500,  # max entries per get_ixan_changes reply
+
+    # Ledger sync
+    "ledger_sync_interval_seconds": 30,
+    "ledger_sync_chunk_bytes": 256 * 1024,  # max size of one get_blocks reply
+
+    # Gossip
+    "gossip_fanout": 8,  # peers each new item is announced to (invs are only hashes, so be generous)
+    "gossip_workers": 8,  # concurrent inv sends / pulls
+
+    # Metrics (Prometheus text at http://metrics_host:metrics_port/metrics); None disables
+    "metrics_host": "127.0.0.1",
+    "metrics_port": 9100,
+
+    # Fan-out to many peers (periodic announce, block broadcast)
+    "fanout_workers": 32,  # calls in flight at once
+    "fanout_max_targets": 64,  # random subset of peers per round when there are more
+    "fanout_deadline_seconds": 10.0,  # a round returns after this, slow peers are counted as timed out
 }
 
 # Ensure db dir exists
@@ -86,75 +147,191 @@ def make_message_for_rpc(*parts) -> str:
 
 
 # ----------------------------
-# Simple SQLite-backed peer DB
+# Peer table: in memory, persisted to SQLite behind the scenes
 # ----------------------------
 class PeerDB:
-    def __init__(self, db_path=CONFIG["db_file"]):
+    """
+    Known peers with their round trip time (EWMA), consecutive failures and last-seen time.
+    Reads and updates only touch memory; changed rows are written to peers.db in one batch
+    every flush_interval seconds by a background thread (and on close()).
+    Peers are ranked by score (lower is better), and the ranking is cached for rank_ttl
+    seconds so picking a peer is O(1).
+    `version` goes up whenever a peer is added or removed.
+    """
+
+    RTT_ALPHA = 0.3  # weight of the newest RTT sample in the moving average
+    UNKNOWN_RTT = 1.0  # seconds assumed for peers we have not measured yet
+
+    def __init__(self, db_path=CONFIG["db_file"], flush_interval=5.0, rank_ttl=1.0, failure_threshold=3):
         self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.rank_ttl = rank_ttl
+        self.failure_threshold = failure_threshold
         self._lock = threading.Lock()
+        self._peers = {}  # (host, port) -> {"last_seen", "rtt", "failures"}
+        self._dirty = set()
+        self._ranked = []
+        self._ranked_at = 0.0
+        self.version = 0
+        self._stop = threading.Event()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._init_db()
+        self._load()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
 
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        try:
-            c = conn.cursor()
-            c.execute(
-                """
-                CREATE TABLE IF NOT EXISTS peers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    host TEXT NOT NULL,
-                    port INTEGER NOT NULL,
-                    last_seen TEXT,
-                    UNIQUE(host, port)
-                )
-                """
+        c = self.conn.cursor()
+        c.execute(
+            """
+            CREATE TABLE IF NOT EXISTS peers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                host TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                last_seen TEXT,
+                UNIQUE(host, port)
             )
-            conn.commit()
-        finally:
-            conn.close()
-
+            """
+        )
+        columns = [row[1] for row in c.execute("PRAGMA table_info(peers)").fetchall()]
+        if "rtt" not in columns:
+            c.execute("ALTER TABLE peers ADD COLUMN rtt REAL")
+        if "failures" not in columns:
+            c.execute("ALTER TABLE peers ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+        self.conn.commit()
+
+    def _load(self):
+        for host, port, last_seen, rtt, failures in self.conn.execute(
+                "SELECT host, port, last_seen, rtt, failures FROM peers"):
+            self._peers[(host, int(port))] = {"last_seen": last_seen, "rtt": rtt, "failures": failures}
+
+    # --- Updates (memory only) ---
     def add_or_update(self, host, port):
-        now = datetime.utcnow().isoformat()
+        key = (host, int(port))
         with self._lock:
-            conn = sqlite3.connect(self.db_path)
-            try:
-                c = conn.cursor()
-                # insert or update last_seen
-                c.execute(
-                    "INSERT INTO peers (host, port, last_seen) VALUES (?, ?, ?) "
-                    "ON CONFLICT(host, port) DO UPDATE SET last_seen=excluded.last_seen",
-                    (host, int(port), now),
-                )
-                conn.commit()
-            finally:
-                conn.close()
+            peer = self._peers.get(key)
+            if peer is None:
+                peer = self._peers[key] = {"last_seen": None, "rtt": None, "failures": 0}
+                self._ranked_at = 0.0  # membership changed: rank again on next pick
+                self.version += 1
+            peer["last_seen"] = datetime.utcnow().isoformat()
+            self._dirty.add(key)
+
+    def observe(self, host, port, ok, rtt=None):
+        """Record the outcome of a call to a known peer (RPCConnectionPool listener signature)."""
+        key = (host, int(port))
+        with self._lock:
+            peer = self._peers.get(key)
+            if peer is None:
+                return
+            if ok:
+                peer["failures"] = 0
+                peer["last_seen"] = datetime.utcnow().isoformat()
+                if rtt is not None:
+                    peer["rtt"] = rtt if peer["rtt"] is None else (
+                        self.RTT_ALPHA * rtt + (1 - self.RTT_ALPHA) * peer["rtt"])
+            else:
+                peer["failures"] += 1
+            self._dirty.add(key)
+
+    def remove(self, host, port):
+        key = (host, int(port))
+        with self._lock:
+            if self._peers.pop(key, None) is not None:
+                self._dirty.add(key)
+                self._ranked_at = 0.0
+                self.version += 1
+
+    # --- Reads ---
+    def count(self):
+        return len(self._peers)
 
     def list_peers(self):
         with self._lock:
-            conn = sqlite3.connect(self.db_path)
-            try:
-                c = conn.cursor()
-                c.execute("SELECT host, port, last_seen FROM peers")
-                return c.fetchall()
-            finally:
-                conn.close()
+            return [(h, p, peer["last_seen"]) for (h, p), peer in self._peers.items()]
 
-    def pick_random_peer(self):
+    def get(self, host, port):
         with self._lock:
-            conn = sqlite3.connect(self.db_path)
+            peer = self._peers.get((host, int(port)))
+            return dict(peer) if peer else None
+
+    def score(self, peer):
+        # Expected RTT, penalised hard for consecutive failures
+        rtt = peer["rtt"] if peer["rtt"] is not None else self.UNKNOWN_RTT
+        return rtt * (1 + peer["failures"]) ** 2
+
+    def _rank(self):
+        # Caller holds the lock; re-sorts at most once per rank_ttl
+        now = time.monotonic()
+        if now - self._ranked_at >= self.rank_ttl:
+            self._ranked = sorted(
+                self._peers,
+                key=lambda k: (self._peers[k]["failures"] >= self.failure_threshold, self.score(self._peers[k])))
+            self._ranked_at = now
+        return self._ranked
+
+    def ranked_peers(self):
+        """[(host, port), ...] best first; peers past failure_threshold come last."""
+        with self._lock:
+            return list(self._rank())
+
+    def best_peers(self, n):
+        with self._lock:
+            return self._rank()[:n]
+
+    def pick_random_peer(self, top=8):
+        """A random peer among the `top` best ranked ones, or None."""
+        with self._lock:
+            ranked = self._rank()
+            return ranked[random.randrange(min(top, len(ranked)))] if ranked else None
+
+    # --- Write-behind persistence ---
+    def flush(self):
+        """Write every changed peer to peers.db in one transaction. Returns the number of rows written."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [(h, p, self._peers[(h, p)]) for h, p in dirty if (h, p) in self._peers]
+            removed = [(h, p) for h, p in dirty if (h, p) not in self._peers]
             try:
-                c = conn.cursor()
-                c.execute("SELECT host, port FROM peers ORDER BY RANDOM() LIMIT 1")
-                r = c.fetchone()
-                return (r[0], r[1]) if r else None
-            finally:
-                conn.close()
+                c = self.conn.cursor()
+                c.executemany(
+                    "INSERT INTO peers (host, port, last_seen, rtt, failures) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(host, port) DO UPDATE SET last_seen=excluded.last_seen, "
+                    "rtt=excluded.rtt, failures=excluded.failures",
+                    [(h, p, peer["last_seen"], peer["rtt"], peer["failures"]) for h, p, peer in rows])
+                c.executemany("DELETE FROM peers WHERE host = ? AND port = ?", removed)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                # Keep the changes for the next flush
+                self.conn.rollback()
+                self._dirty |= dirty
+                print(f"PeerDB flush failed: {e}")
+                return 0
+        return len(rows) + len(removed)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            self.conn.close()
 
 
 # ----------------------------
 # File saving helpers
 # ----------------------------
-from ledger import Ledger
+from ledger import Ledger, block_hash
+from mempool import Mempool, ParsedTx
+from gossip import Gossip
+from fanout import FanOut
+from ingest import BlockIngest, REJECTED, ORPHAN, APPENDED
+from metrics import Metrics, MetricsServer, instrument_handler
+import compactblock
+from xdns import get_resolver
+from ixan import get_registry
 import base64
 import json
 
@@ -176,18 +353,37 @@ def save_state(xml_payload: str):
 # Threaded XML-RPC server
 # ----------------------------
 class ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
-    pass
+    # Keep-alive handler threads may sit idle on a connection; don't wait for them on shutdown
+    daemon_threads = True
+    on_bytes = None  # on_bytes(direction, n) for every request ("in") / response ("out") body
+
+    def _marshaled_dispatch(self, data, dispatch_method=None, path=None):
+        response = super()._marshaled_dispatch(data, dispatch_method, path)
+        if self.on_bytes is not None:
+            self.on_bytes("in", len(data))
+            self.on_bytes("out", len(response))
+        return response
 
 
 class NodeRPCHandler:
     """Instance with RPC-callable methods. An instance of this class is registered with the XMLRPC server."""
 
-    def __init__(self, node_host, node_port, peer_db: PeerDB, secret: str):
+    def __init__(self, node_host, node_port, peer_db: PeerDB, secret: str, dns=None, ledger=None, gossip=None,
+                 ingest=None, ixans=None):
         self.node_host = node_host
         self.node_port = node_port
         self.peer_db = peer_db
         self.secret = secret
-        self.ledger = Ledger()
+        self.ledger = ledger if ledger is not None else Ledger()
+        self.dns = dns if dns is not None else get_resolver(CONFIG["dns_file"])
+        self.ixans = ixans if ixans is not None else get_registry(CONFIG["ixan_file"])
+        self.gossip = gossip
+        self.ingest = ingest if ingest is not None else BlockIngest(self.ledger)
+        self._state = None  # (peer set version, tip hash, etag, xml)
+        # The peer set version restarts at 0 with the process, so a restarted node with a different
+        # peer set could hand out an etag a caller cached before the restart. Mixed into every etag.
+        self._epoch = os.urandom(8).hex()
+        self._state_lock = threading.Lock()
 
     # Helper: check timestamp + signature tolerance
     def _check_time_and_signature(self, signature: str, timestamp: float, nonce: str, payload: str = ""):
@@ -222,23 +418,52 @@ class NodeRPCHandler:
         print(f"Peer announced: {host}:{port}")
         return {"success": True, "reason": "added"}
 
+    def _current_state(self):
+        """(etag, xml) of the node state, rebuilt only when the peer set or the ledger tip changed."""
+        self.ledger.refresh()
+        height, tip_hash = self.ledger.tip()
+        version = self.peer_db.version
+        with self._state_lock:
+            if self._state is not None and self._state[:2] == (version, tip_hash):
+                return self._state[2], self._state[3]
+            etag = hashlib.sha256(f"{self.node_host}:{self.node_port}:{self._epoch}:{version}:{tip_hash}".encode("utf-8")).hexdigest()[:16]
+            # Build simple xml state
+            root = ET.Element("state")
+            ET.SubElement(root, "host").text = str(self.node_host)
+            ET.SubElement(root, "port").text = str(self.node_port)
+            ET.SubElement(root, "time").text = datetime.utcnow().isoformat()  # When this state was built
+            ET.SubElement(root, "etag").text = etag
+            ET.SubElement(root, "height").text = str(height)
+            ET.SubElement(root, "tip").text = tip_hash
+            peers_el = ET.SubElement(root, "known_peers")
+            for h, p, _ in self.peer_db.list_peers():
+                p_el = ET.SubElement(peers_el, "peer")
+                ET.SubElement(p_el, "host").text = h
+                ET.SubElement(p_el, "port").text = str(p)
+            xml = ET.tostring(root, encoding="utf-8").decode("utf-8")
+            self._state = (version, tip_hash, etag, xml)
+            return etag, xml
+
     def get_state(self, timestamp: float, nonce: str, signature: str):
         """Return the node state (xml string) if signature valid."""
         ok, reason = self._check_time_and_signature(signature, timestamp, nonce)
         if not ok:
             raise Fault(1, f"auth_failed:{reason}")
-        # Build simple xml state
-        root = ET.Element("state")
-        ET.SubElement(root, "host").text = str(self.node_host)
-        ET.SubElement(root, "port").text = str(self.node_port)
-        ET.SubElement(root, "time").text = datetime.utcnow().isoformat()
-        peers_el = ET.SubElement(root, "known_peers")
-        for h, p, _ in self.peer_db.list_peers():
-            p_el = ET.SubElement(peers_el, "peer")
-            ET.SubElement(p_el, "host").text = h
-            ET.SubElement(p_el, "port").text = str(p)
-        xml = ET.tostring(root, encoding="utf-8").decode("utf-8")
-        return xml
+        return self._current_state()[1]
+
+    def get_state_if_changed(self, etag: str, timestamp: float, nonce: str, signature: str):
+        """
+        Conditional get_state. etag is the <etag> of the state the caller already has (any other
+        value, e.g. "-", if it has none).
+        Returns: dict(modified: bool, etag: str[, state: xml string when modified])
+        """
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, etag)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        current, xml = self._current_state()
+        if etag == current:
+            return {"modified": False, "etag": current}
+        return {"modified": True, "etag": current, "state": xml}
 
     def get_ledger(self, timestamp: float, nonce: str, signature: str):
         """Return the raw ledger file content (base64 encoded) if authorized."""
@@ -252,6 +477,34 @@ class NodeRPCHandler:
         b64_data = base64.b64encode(raw_data).decode('utf-8')
         return b64_data
 
+    def get_chain_tip(self, timestamp: float, nonce: str, signature: str):
+        """Return {"height": number of blocks, "hash": hash of the last block} as a json string, if authorized."""
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        # Blocks mined by another process only reach us through the file
+        self.ledger.refresh()
+        height, tip_hash = self.ledger.tip()
+        return json.dumps({"height": height, "hash": tip_hash})
+
+    def get_blocks(self, request: str, timestamp: float, nonce: str, signature: str):
+        """Return blocks starting at a height, as a json string, if authorized.
+        request is "from_height:max_bytes"; max_bytes is capped by ledger_sync_chunk_bytes.
+        Reply: {"blocks": [block, ...], "height": our height}
+        """
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, request)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        try:
+            from_height, max_bytes = (int(x) for x in request.split(":"))
+        except ValueError:
+            raise Fault(2, "bad_request")
+        max_bytes = min(max(max_bytes, 1), CONFIG["ledger_sync_chunk_bytes"])
+        self.ledger.refresh()
+        blocks = self.ledger.get_blocks(max(from_height, 0), max_bytes)
+        # Blocks are already json: splice them in rather than decoding and encoding again
+        return '{"blocks": [' + ", ".join(blocks) + '], "height": ' + str(self.ledger.height()) + "}"
+
     def send_state(self, xml_payload: str, timestamp: float, nonce: str, signature: str):
         """Receive a state payload (append to file) if signature valid."""
         ok, reason = self._check_time_and_signature(signature, timestamp, nonce, xml_payload)
@@ -270,23 +523,73 @@ class NodeRPCHandler:
         return {"success": True, "reason": "saved"}
 
     def receive_block(self, block_json: str, timestamp: float, nonce: str, signature: str):
-        """Receive a mined block and append to ledger if valid."""
+        """Receive a mined block. It is deduplicated, verified and appended in the background (see ingest.py).
+        Returns at once with reason "accepted", "duplicate" or "rejected"."""
         ok, reason = self._check_time_and_signature(signature, timestamp, nonce, block_json)
         if not ok:
             return {"success": False, "reason": reason}
-        
+
         try:
             block = json.loads(block_json)
-            # In a real system, we would validate the block proof-of-work here
-            # For now, we trust the miner (if they have the hmac secret)
-            # Check if block is already present? 
-            # self.ledger.write handles appending.
-            self.ledger.write(block)
-            print("Received and saved block via RPC.")
-            return {"success": True, "reason": "saved"}
-        except Exception as e:
-            print(f"Failed to save block: {e}")
-            return {"success": False, "reason": str(e)}
+        except ValueError:
+            return {"success": False, "reason": REJECTED}
+        status = self.ingest.submit(block)
+        return {"success": status != REJECTED, "reason": status}
+
+    def get_dns_changes(self, since_version: str, timestamp: float, nonce: str, signature: str):
+        """Return DNS records written after since_version as a json string, if authorized.
+        Reply: {"records": [[name, address, updated_at, version], ...], "latest": current version}
+        """
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, since_version)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        records = self.dns.changes_since(int(since_version), CONFIG["dns_sync_batch"])
+        return json.dumps({"records": records, "latest": self.dns.get_version()})
+
+    def get_ixan_changes(self, since_version: str, timestamp: float, nonce: str, signature: str):
+        """Return IXAN registry entries added after since_version as a json string, if authorized.
+        Reply: {"records": [[ixan, identity, version], ...], "latest": current version}
+        """
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, since_version)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        records = self.ixans.changes_since(int(since_version), CONFIG["ixan_sync_batch"])
+        return json.dumps({"records": records, "latest": self.ixans.get_version()})
+
+    def gossip_inv(self, payload: str, timestamp: float, nonce: str, signature: str):
+        """A peer announces items it has: {"from": "host:port", "items": [[kind, hash], ...]}.
+        Items we miss are pulled from it in the background."""
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, payload)
+        if not ok:
+            return {"success": False, "reason": reason}
+        if self.gossip is None:
+            return {"success": False, "reason": "gossip_disabled"}
+        return {"success": True, "wanted": self.gossip.on_inv(payload)}
+
+    def gossip_getdata(self, payload: str, timestamp: float, nonce: str, signature: str):
+        """Return the items asked for in {"items": [[kind, hash], ...]} that we have, as a json string."""
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, payload)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        if self.gossip is None:
+            raise Fault(1, "gossip_disabled")
+        return self.gossip.on_getdata(payload)
+
+    def get_block_txs(self, payload: str, timestamp: float, nonce: str, signature: str):
+        """Transactions of a block we hold, by position: {"hash": block hash, "indexes": [...]}.
+        Reply (json): {"txs": [tx, ...]} in the order asked."""
+        ok, reason = self._check_time_and_signature(signature, timestamp, nonce, payload)
+        if not ok:
+            raise Fault(1, f"auth_failed:{reason}")
+        request = json.loads(payload)
+        block = self.ledger.get_block(request["hash"])
+        if block is None:
+            raise Fault(2, "unknown_block")
+        transactions = block.get("transactions", [])
+        try:
+            return json.dumps({"txs": [transactions[i] for i in request["indexes"]]}, default=str)
+        except (IndexError, TypeError):
+            raise Fault(2, "bad_request")
 
     # Simple ping to check node alive + optional auth
     def ping(self, timestamp: float, nonce: str, signature: str):
@@ -300,56 +603,344 @@ class NodeRPCHandler:
 # Client helpers: XML-RPC calls with HMAC signing
 # ----------------------------
 class HMACTransport(Transport):
-    """Transport helper to set a short timeout (optional)."""
+    """Transport with a socket timeout. Keeps its HTTP/1.1 connection open between calls."""
     timeout = 5.0
 
-
-def rpc_call(host: str, port: int, method: str, secret: str, payload: str = "", timeout: float = 5.0):
+    def __init__(self, timeout=None, on_bytes=None):
+        super().__init__()
+        if timeout is not None:
+            self.timeout = timeout
+        self.on_bytes = on_bytes  # on_bytes(direction, n) for every request ("out") / response ("in") body
+
+    def send_content(self, connection, request_body):
+        if self.on_bytes is not None:
+            self.on_bytes("out", len(request_body))
+        super().send_content(connection, request_body)
+
+    def parse_response(self, response):
+        if self.on_bytes is not None:
+            self.on_bytes("in", int(response.getheader("Content-Length", 0) or 0))
+        return super().parse_response(response)
+
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+        conn = self._connection[1]
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+
+    def make_connection(self, host):
+        # Same as Transport.make_connection, but the stock one never applies a timeout
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        self._connection = host, http.client.HTTPConnection(chost, timeout=self.timeout)
+        return self._connection[1]
+
+
+class RPCConnectionPool:
     """
-    Generic RPC caller that performs HMAC signing and calls remote XML-RPC method.
-    Returns the result or raises.
+    Per-peer pool of keep-alive XML-RPC connections.
+    - Idle connections are reused, at most max_idle_per_peer are kept per peer.
+    - Every call records the peer's health: after failure_threshold consecutive
+      failures the peer is skipped (calls fail fast) for a backoff that doubles
+      with every further failure, up to max_backoff_seconds.
+    - listeners are called as listener(host, port, ok, rtt_seconds) after each call.
+    - on_bytes(direction, n), if set, is called with the size of every request ("out") and response ("in") body.
     """
+
+    def __init__(self, max_idle_per_peer=4, timeout=5.0, failure_threshold=3,
+                 backoff_seconds=10.0, max_backoff_seconds=600.0):
+        self.max_idle_per_peer = max_idle_per_peer
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.listeners = []
+        self.on_bytes = None
+        self._idle = {}  # (host, port) -> [(proxy, transport), ...]
+        self._health = {}  # (host, port) -> {"failures", "down_until", "last_ok", "rtt"}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        transport = HMACTransport(self.timeout, on_bytes=self._count_bytes)
+        proxy = ServerProxy(f"http://{key[0]}:{key[1]}/", transport=transport, allow_none=True)
+        return proxy, transport
+
+    def _count_bytes(self, direction, n):
+        if self.on_bytes is not None:
+            self.on_bytes(direction, n)
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_peer:
+                idle.append(conn)
+                return
+        conn[1].close()
+
+    def _record(self, key, ok, rtt=None):
+        now = time.time()
+        with self._lock:
+            h = self._health.setdefault(key, {"failures": 0, "down_until": 0.0, "last_ok": None, "rtt": None})
+            if ok:
+                h["failures"] = 0
+                h["down_until"] = 0.0
+                h["last_ok"] = now
+                h["rtt"] = rtt
+            else:
+                h["failures"] += 1
+                over = h["failures"] - self.failure_threshold
+                if over >= 0:
+                    h["down_until"] = now + min(self.backoff_seconds * (2 ** over), self.max_backoff_seconds)
+        for listener in self.listeners:
+            try:
+                listener(key[0], key[1], ok, rtt)
+            except Exception:
+                pass
+
+    def is_healthy(self, host, port):
+        h = self._health.get((host, int(port)))
+        return h is None or time.time() >= h["down_until"]
+
+    def health(self, host, port):
+        return dict(self._health.get((host, int(port)), {}))
+
+    def call(self, host, port, method, *args, timeout=None):
+        """Call method(*args) on a peer over a pooled connection. Raises like ServerProxy does."""
+        key = (host, int(port))
+        if not self.is_healthy(host, port):
+            raise ConnectionError(f"peer {host}:{port} is backing off after repeated failures")
+        conn = self._acquire(key)
+        conn[1].set_timeout(timeout if timeout is not None else self.timeout)
+        start = time.monotonic()
+        try:
+            result = getattr(conn[0], method)(*args)
+        except Fault:
+            # The peer answered: the connection and the peer are fine
+            self._release(key, conn)
+            self._record(key, True, time.monotonic() - start)
+            raise
+        except Exception:
+            conn[1].close()
+            self._record(key, False)
+            raise
+        self._release(key, conn)
+        self._record(key, True, time.monotonic() - start)
+        return result
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for _, transport in conns:
+                transport.close()
+
+
+# Pool used by rpc_call when the caller does not bring its own
+default_rpc_pool = RPCConnectionPool()
+
+
+def signed_args(secret: str, payload: str = ""):
+    """Return (timestamp, nonce, signature) for an RPC carrying payload."""
     timestamp = str(time.time())
     nonce = str(random.getrandbits(64))
     message = make_message_for_rpc(timestamp, nonce, payload)
-    signature = make_signature(secret, message)
-    url = f"http://{host}:{port}/"
-    proxy = ServerProxy(url, transport=HMACTransport(), allow_none=True)
-    try:
-        func = getattr(proxy, method)
-        # All RPC methods follow signature: (..., timestamp, nonce, signature) or (payload, timestamp, nonce, signature)
-        if payload:
-            return func(payload, timestamp, nonce, signature)
-        else:
-            return func(timestamp, nonce, signature)
-    finally:
+    return timestamp, nonce, make_signature(secret, message)
+
+
+def rpc_call(host: str, port: int, method: str, secret: str, payload: str = "", timeout: float = 5.0, pool=None):
+    """
+    Generic RPC caller that performs HMAC signing and calls remote XML-RPC method.
+    Returns the result or raises.
+    """
+    timestamp, nonce, signature = signed_args(secret, payload)
+    pool = pool if pool is not None else default_rpc_pool
+    # All RPC methods follow signature: (..., timestamp, nonce, signature) or (payload, timestamp, nonce, signature)
+    if payload:
+        return pool.call(host, port, method, payload, timestamp, nonce, signature, timeout=timeout)
+    else:
+        return pool.call(host, port, method, timestamp, nonce, signature, timeout=timeout)
+
+
+# ----------------------------
+# Discovery: concurrent subnet scanner
+# ----------------------------
+class DiscoveryScanner:
+    """
+    Probes every subnet_base+1..254 x ports endpoint with at most max_in_flight probes at once.
+    Peers already in the PeerDB are probed first, most recently seen first. An endpoint that
+    does not answer goes into a dead cache and is skipped for dead_ttl seconds, doubling with
+    each further miss up to max_dead_ttl.
+    """
+
+    def __init__(self, node, subnet_base, ports, max_in_flight=64, probe_timeout=1.0,
+                 dead_ttl=60.0, max_dead_ttl=3600.0):
+        self.node = node
+        self.subnet_base = subnet_base
+        self.ports = list(ports)
+        self.max_in_flight = max_in_flight
+        self.probe_timeout = probe_timeout
+        self.dead_ttl = dead_ttl
+        self.max_dead_ttl = max_dead_ttl
+        self.dead = {}  # (host, port) -> (misses, retry_at)
+        self._lock = threading.Lock()
+
+    def is_dead(self, host, port, now=None):
+        entry = self.dead.get((host, int(port)))
+        return entry is not None and (now or time.time()) < entry[1]
+
+    def _mark(self, key, alive):
+        with self._lock:
+            if alive:
+                self.dead.pop(key, None)
+                return
+            misses = self.dead.get(key, (0, 0))[0] + 1
+            self.dead[key] = (misses, time.time() + min(self.dead_ttl * 2 ** (misses - 1), self.max_dead_ttl))
+
+    def targets(self):
+        """Endpoints to probe this round, known peers first; ourselves and dead endpoints left out."""
+        now = time.time()
+        me = (self.node.host, int(self.node.port))
+        known = sorted(self.node.peer_db.list_peers(), key=lambda r: r[2] or "", reverse=True)
+        ordered = [(h, int(p)) for h, p, _ in known]
+        subnet = [(self.subnet_base + str(i), port) for i in range(1, 255) for port in self.ports]
+        random.shuffle(subnet)
+        seen = set()
+        out = []
+        for key in ordered + subnet:
+            if key in seen or key == me or self.is_dead(key[0], key[1], now):
+                continue
+            seen.add(key)
+            out.append(key)
+        return out
+
+    def probe(self, host, port):
+        """Ping an endpoint and announce ourselves to it. Returns True if it is a node."""
+        key = (host, int(port))
+        try:
+            # A bare connect fails fast on closed ports and empty addresses
+            socket.create_connection(key, timeout=self.probe_timeout).close()
+            result = rpc_call(host, port, "ping", self.node.secret, timeout=self.probe_timeout, pool=self.node.rpc_pool)
+            alive = isinstance(result, dict) and result.get("success")
+        except Exception:
+            alive = False
+        self._mark(key, alive)
+        if not alive:
+            return False
         try:
-            proxy("close")  # not a real call — just attempt to cleanly close underlying transport (best-effort)
+            res = self.node.announce_to(host, port)
+            if isinstance(res, dict) and res.get("success"):
+                print(f"Roaming: announced to {host}:{port}")
         except Exception:
             pass
+        self.node.peer_db.add_or_update(host, port)
+        return True
+
+    def scan_once(self, stop_event=None):
+        """Probe every current target once. Returns the list of endpoints that answered."""
+        found = []
+        targets = iter(self.targets())
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="scan") as pool:
+            running = {}
+            while True:
+                # Keep the window full
+                while len(running) < self.max_in_flight and not (stop_event and stop_event.is_set()):
+                    key = next(targets, None)
+                    if key is None:
+                        break
+                    running[pool.submit(self.probe, *key)] = key
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        found.append(running[future])
+                    del running[future]
+        return found
 
 
 # ----------------------------
 # Node Manager: starts server, roaming, announce threads and controls shutdown
 # ----------------------------
 class NodeManager:
-    def __init__(self, host: str, port: int, secret: str):
+    def __init__(self, host: str, port: int, secret: str, server_mode=None, db_dir=None):
+        """db_dir: keep peers.db, dns.db, ixan.db, ledger.data and mempool.bin there instead of the CONFIG paths
+        (several nodes in one process or on one machine, see cluster.py)."""
         self.host = host
         self.port = port
         self.secret = secret
-        self.peer_db = PeerDB()
+        self.server_mode = server_mode or CONFIG["server_mode"]
+        if db_dir is not None:
+            os.makedirs(db_dir, exist_ok=True)
+            self.peer_db = PeerDB(os.path.join(db_dir, "peers.db"))
+            self.dns = get_resolver(os.path.join(db_dir, "dns.db"))
+            self.ixans = get_registry(os.path.join(db_dir, "ixan.db"))
+            self.ledger = Ledger(os.path.join(db_dir, "ledger.data"))
+            self.mempool = Mempool(os.path.join(db_dir, "mempool.bin"), self.ixans.db_path)
+        else:
+            self.peer_db = PeerDB()
+            self.dns = get_resolver(CONFIG["dns_file"])
+            self.ixans = get_registry(CONFIG["ixan_file"])
+            self.ledger = Ledger()
+            self.mempool = Mempool(registry_path=self.ixans.db_path)
+        self._mempool_lock = threading.Lock()
+        self.rpc_pool = RPCConnectionPool()
+        self.peer_states = {}  # (host, port) -> (etag, state xml) last fetched by call_get_state
+        self.fan_out = FanOut(workers=CONFIG["fanout_workers"], max_targets=CONFIG["fanout_max_targets"],
+                              deadline=CONFIG["fanout_deadline_seconds"])
+        # Every pooled call updates the peer's RTT / failure count
+        self.rpc_pool.listeners.append(self.peer_db.observe)
+        self.gossip = Gossip(f"{host}:{port}", self._gossip_call,
+                             self.peer_db.ranked_peers,
+                             fanout=CONFIG["gossip_fanout"], workers=CONFIG["gossip_workers"])
+        self.gossip.register("tx", lambda h: self.mempool.get_tx(h) is not None, self._get_tx, self._put_tx)
+        self.gossip.register("block", lambda h: self.ledger.get_block(h) is not None, self._get_block, self._put_block)
+        # Blocks from peers: verified off the RPC threads, appended by one writer, then gossiped on
+        self.ingest = BlockIngest(self.ledger, on_accept=self._on_block_accepted)
+        self.metrics = Metrics()
+        self.rpc_pool.on_bytes = self._count_called_bytes
+        self._register_gauges()
+        self.metrics_server = None
         self.server = None
         self.server_thread = None
         self.stop_event = threading.Event()
         self.threads = []
 
     def start_server(self):
+        handler_instance = NodeRPCHandler(self.host, self.port, self.peer_db, self.secret, dns=self.dns, ledger=self.ledger,
+                                          gossip=self.gossip, ingest=self.ingest, ixans=self.ixans)
+        instrument_handler(handler_instance, self.metrics)
+        if self.server_mode == "async":
+            from async_node import AsyncXMLRPCServer
+            self.server = AsyncXMLRPCServer(handler_instance, self.host, self.port,
+                                            max_concurrency=CONFIG["async_max_concurrency"],
+                                            max_connections=CONFIG["async_max_connections"])
+            self.server.on_bytes = self._count_served_bytes
+            self.server_thread = self.server.start()
+            self.threads.append(self.server_thread)
+            print(f"XML-RPC server (asyncio) listening on {self.host}:{self.port}")
+            return
+
         # Bind XML-RPC server in a threaded way
         class RequestHandler(SimpleXMLRPCRequestHandler):
             rpc_paths = ("/",)
+            # Keep connections open for pooled clients; drop them after 30s idle
+            protocol_version = "HTTP/1.1"
+            timeout = 30
+
+            def log_message(self, format, *args):
+                # A pooled client's idle connection timing out is routine, not an error
+                if not format.startswith("Request timed out"):
+                    super().log_message(format, *args)
 
         self.server = ThreadedXMLRPCServer((self.host, self.port), requestHandler=RequestHandler, allow_none=True, logRequests=False)
-        handler_instance = NodeRPCHandler(self.host, self.port, self.peer_db, self.secret)
+        self.server.on_bytes = self._count_served_bytes
         # Register functions from the handler instance
         self.server.register_instance(handler_instance)
 
@@ -358,103 +949,321 @@ class NodeManager:
         self.server_thread.start()
         self.threads.append(self.server_thread)
 
+    def _count_served_bytes(self, direction, n):
+        self.metrics.rpc_bytes.inc("server", direction, amount=n)
+
+    def _count_called_bytes(self, direction, n):
+        self.metrics.rpc_bytes.inc("client", direction, amount=n)
+
     def stop_server(self):
         if self.server:
             print("Shutting down XML-RPC server...")
             try:
                 self.server.shutdown()
-                self.server.server_close()
+                if self.server_mode != "async":
+                    self.server.server_close()
             except Exception:
                 pass
             self.server = None
 
+    def announce_to(self, host, port, signed=None):
+        """Call announce(our host, our port, timestamp, nonce, signature) on a peer."""
+        timestamp, nonce, signature = signed or signed_args(self.secret, f"{self.host}:{self.port}")
+        return self.rpc_pool.call(host, port, "announce", self.host, int(self.port), timestamp, nonce, signature)
+
     def roam_discovery(self, subnet_base: str, ports, interval_sec: float):
-        """Continuously probe `subnet_baseX` and ports list to attempt announce/ping/GET_STATE.
-        We call remote 'announce' RPC to introduce ourselves (if available).
+        """Repeatedly scan `subnet_baseX` and the ports list, announcing ourselves to every node that answers.
+        Each scan runs probes concurrently; see DiscoveryScanner.
         """
         print("Roaming discovery thread started (subnet:", subnet_base, "ports:", ports, ")")
+        scanner = DiscoveryScanner(self, subnet_base, ports,
+                                   max_in_flight=CONFIG["roam_max_in_flight"],
+                                   probe_timeout=CONFIG["roam_probe_timeout"],
+                                   dead_ttl=CONFIG["roam_dead_ttl_seconds"],
+                                   max_dead_ttl=CONFIG["roam_max_dead_ttl_seconds"])
         while not self.stop_event.is_set():
             try:
-                target_last = random.randint(1, 254)
-                target_host = subnet_base + str(target_last)
-                target_port = random.choice(ports)
-                # Try ping first to see if server responds
-                try:
-                    result = rpc_call(target_host, target_port, "ping", self.secret, payload="")
-                    if isinstance(result, dict) and result.get("success"):
-                        # contact succeeded; announce ourselves also
-                        announce_payload = f"{self.host}:{self.port}"
-                        # call announce(host, port, timestamp, nonce, signature)
-                        # We need to call the raw announce signature; construct call differently:
-                        timestamp = str(time.time())
-                        nonce = str(random.getrandbits(64))
-                        message = make_message_for_rpc(timestamp, nonce, announce_payload)
-                        signature = make_signature(self.secret, message)
-                        url = f"http://{target_host}:{target_port}/"
-                        proxy = ServerProxy(url, transport=HMACTransport(), allow_none=True)
-                        try:
-                            res = proxy.announce(self.host, int(self.port), timestamp, nonce, signature)
-                            if isinstance(res, dict) and res.get("success"):
-                                print(f"Roaming: announced to {target_host}:{target_port}")
-                                self.peer_db.add_or_update(target_host, target_port)
-                        except Exception:
-                            pass
-                        finally:
-                            try:
-                                proxy("close")
-                            except Exception:
-                                pass
-                except Exception:
-                    # unreachable or not XML-RPC
-                    pass
-                # Sleep a bit (randomized)
-                time.sleep(max(0.5, random.random() * interval_sec))
+                start = time.time()
+                with self.metrics.timed("roam_scan"):
+                    found = scanner.scan_once(self.stop_event)
+                print(f"Roaming: scan found {len(found)} nodes in {time.time() - start:.1f}s")
             except Exception as e:
                 # Fail-safe and keep running
-                time.sleep(1.0)
+                print(f"Roaming scan failed: {e}")
+            self.stop_event.wait(interval_sec)
         print("Roaming discovery thread exiting.")
 
     def periodic_announce(self, interval_seconds=30):
-        """Periodically announce to peers in the DB to keep them alive/known."""
+        """Periodically announce to peers in the DB to keep them alive/known.
+        Peers are called concurrently (see FanOut), so dead peers cannot stall the round."""
         while not self.stop_event.is_set():
-            peers = self.peer_db.list_peers()
-            announce_payload = f"{self.host}:{self.port}"
             # sign message once per loop
-            timestamp = str(time.time())
-            nonce = str(random.getrandbits(64))
-            message = make_message_for_rpc(timestamp, nonce, announce_payload)
-            signature = make_signature(self.secret, message)
-            for h, p, _ in peers:
-                try:
-                    url = f"http://{h}:{p}/"
-                    proxy = ServerProxy(url, transport=HMACTransport(), allow_none=True)
+            signed = signed_args(self.secret, f"{self.host}:{self.port}")
+
+            def announce(h, p):
+                res = self.announce_to(h, p, signed)
+                if isinstance(res, dict) and res.get("success"):
+                    self.peer_db.add_or_update(h, p)
+                    return True
+                return False
+
+            peers = [(h, p) for h, p, _ in self.peer_db.list_peers()]
+            if peers:
+                with self.metrics.timed("announce"):
+                    result = self.fan_out.run(peers, announce)
+                if result["failed"] or result["timed_out"]:
+                    print(f"Announce round: {result['ok']}/{result['targets']} ok, {result['failed']} failed, "
+                          f"{result['timed_out']} timed out ({result['elapsed']:.1f}s)")
+            # Sleep in small increments to allow quick shutdown
+            for _ in range(int(interval_seconds)):
+                if self.stop_event.is_set():
+                    break
+                time.sleep(1)
+
+    def sync_dns_from(self, host, port):
+        """Pull the DNS records a peer changed since our last pull from it. Returns the number applied."""
+        peer = f"{host}:{port}"
+        since = self.dns.get_sync_cursor(peer)
+        applied = 0
+        while True:
+            reply = json.loads(rpc_call(host, port, "get_dns_changes", self.secret, payload=str(since), pool=self.rpc_pool))
+            if reply["latest"] < since:
+                # The peer's table is behind our cursor (it was reset): start again from scratch
+                since = 0
+                continue
+            records = reply["records"]
+            if not records:
+                break
+            applied += self.dns.apply_records(records)
+            since = records[-1][3]
+            self.dns.set_sync_cursor(peer, since)
+            if len(records) < CONFIG["dns_sync_batch"]:
+                break
+        return applied
+
+    def periodic_dns_sync(self, interval_seconds=60):
+        """Periodically pull DNS changes from every known peer."""
+        while not self.stop_event.is_set():
+            with self.metrics.timed("dns_sync"):
+                for h, p in self.peer_db.ranked_peers():
+                    try:
+                        applied = self.sync_dns_from(h, p)
+                        if applied:
+                            print(f"DNS sync: {applied} records from {h}:{p}")
+                    except Exception:
+                        pass
+            # Sleep in small increments to allow quick shutdown
+            for _ in range(int(interval_seconds)):
+                if self.stop_event.is_set():
+                    break
+                time.sleep(1)
+
+    def sync_ixans_from(self, host, port):
+        """Pull the IXAN registry entries a peer added since our last pull from it. Returns the number applied."""
+        peer = f"{host}:{port}"
+        since = self.ixans.get_sync_cursor(peer)
+        applied = 0
+        while True:
+            reply = json.loads(rpc_call(host, port, "get_ixan_changes", self.secret, payload=str(since), pool=self.rpc_pool))
+            if reply["latest"] < since:
+                # The peer's registry is behind our cursor (it was reset): start again from scratch
+                since = 0
+                continue
+            records = reply["records"]
+            if not records:
+                break
+            applied += self.ixans.apply_records(records)
+            since = records[-1][2]
+            self.ixans.set_sync_cursor(peer, since)
+            if len(records) < CONFIG["ixan_sync_batch"]:
+                break
+        return applied
+
+    def periodic_ixan_sync(self, interval_seconds=60):
+        """Periodically pull IXAN registry entries from every known peer."""
+        while not self.stop_event.is_set():
+            with self.metrics.timed("ixan_sync"):
+                for h, p in self.peer_db.ranked_peers():
                     try:
-                        res = proxy.announce(self.host, int(self.port), timestamp, nonce, signature)
-                        if isinstance(res, dict) and res.get("success"):
-                            self.peer_db.add_or_update(h, p)
+                        applied = self.sync_ixans_from(h, p)
+                        if applied:
+                            print(f"IXAN sync: {applied} entries from {h}:{p}")
                     except Exception:
                         pass
-                    finally:
-                        try:
-                            proxy("close")
-                        except Exception:
-                            pass
-                except Exception:
-                    pass
             # Sleep in small increments to allow quick shutdown
             for _ in range(int(interval_seconds)):
                 if self.stop_event.is_set():
                     break
                 time.sleep(1)
 
+    def sync_ledger_from(self, host, port):
+        """Pull the blocks a peer has beyond our height. Returns the number of blocks appended.
+        Every chunk goes through block ingest (verified, then appended by its writer) before the next
+        one is requested, so an interrupted sync resumes from where it stopped.
+        Raises ValueError if a chunk does not verify or does not continue our chain.
+        """
+        self.ledger.refresh()
+        start = self.ledger.height()
+        tip = json.loads(rpc_call(host, port, "get_chain_tip", self.secret, pool=self.rpc_pool))
+        while self.ledger.height() < tip["height"]:
+            request = f"{self.ledger.height()}:{CONFIG['ledger_sync_chunk_bytes']}"
+            reply = json.loads(rpc_call(host, port, "get_blocks", self.secret, payload=request, pool=self.rpc_pool))
+            if not reply["blocks"]:
+                break
+            for block in reply["blocks"]:
+                if self.ingest.submit(block) == REJECTED:
+                    raise ValueError(f"Malformed block from {host}:{port}")
+            last = reply["blocks"][-1]
+            state = self.ingest.wait(last["hash"], timeout=60.0)
+            if state != APPENDED:
+                raise ValueError(f"Block {last.get('index')} from {host}:{port} was not appended ({state})")
+            tip["height"] = reply["height"]
+        return self.ledger.height() - start
+
+    def periodic_ledger_sync(self, interval_seconds=30):
+        """Periodically catch up with any known peer whose chain is longer than ours."""
+        while not self.stop_event.is_set():
+            # Fastest, healthiest peers first
+            with self.metrics.timed("ledger_sync"):
+                for h, p in self.peer_db.ranked_peers():
+                    try:
+                        appended = self.sync_ledger_from(h, p)
+                        if appended:
+                            print(f"Ledger sync: {appended} blocks from {h}:{p}")
+                    except Exception as e:
+                        if isinstance(e, ValueError):
+                            print(f"Ledger sync from {h}:{p} stopped: {e}")
+            # Sleep in small increments to allow quick shutdown
+            for _ in range(int(interval_seconds)):
+                if self.stop_event.is_set():
+                    break
+                time.sleep(1)
+
+    # --- Gossip ---
+    def _gossip_call(self, host, port, method, payload):
+        return rpc_call(host, port, method, self.secret, payload=payload, pool=self.rpc_pool)
+
+    def _get_tx(self, tx_hash):
+        tx = self.mempool.get_tx(tx_hash)
+        return json.dumps(tx.to_xmif()) if tx is not None else None
+
+    def _put_tx(self, tx_hash, payload, source):
+        xmif = json.loads(payload)
+        if ParsedTx.from_xmif(xmif).hash != tx_hash:
+            return False
+        with self._mempool_lock:
+            if self.mempool.get_tx(tx_hash) is None:
+                try:
+                    # Checks the signature
+                    self.mempool.store_tx(xmif)
+                except ValueError:
+                    return False
+        return True
+
+    def _get_block(self, hash_):
+        # Blocks are gossiped in compact form
+        block = self.ledger.get_block(hash_)
+        return json.dumps(compactblock.encode(block), default=str) if block is not None else None
+
+    def _fetch_block_txs(self, source, hash_, indexes):
+        host, port = source.rsplit(":", 1)
+        payload = json.dumps({"hash": hash_, "indexes": indexes})
+        return json.loads(rpc_call(host, int(port), "get_block_txs", self.secret, payload=payload, pool=self.rpc_pool))["txs"]
+
+    def _put_block(self, hash_, payload, source):
+        compact = json.loads(payload)
+        if compact["header"]["hash"] != hash_:
+            return False
+        if self.ledger.get_block(hash_) is not None:
+            return True
+        with self._mempool_lock:
+            pending = list(self.mempool.mempool)
+        transactions, missing = compactblock.reconstruct(compact, compactblock.mempool_index(hash_, pending))
+        if missing:
+            # Only what our mempool does not have crosses the wire
+            for i, tx in zip(missing, self._fetch_block_txs(source, hash_, missing)):
+                transactions[i] = tx
+        try:
+            block = compactblock.assemble(compact, transactions)
+        except ValueError:
+            # Short ID collision or a mempool copy that differs: take the full list from the sender
+            block = compactblock.assemble(compact, self._fetch_block_txs(source, hash_, list(range(len(transactions)))))
+        if block_hash(block) != hash_:
+            return False
+        self.ingest.submit(block)
+        if self.ingest.wait(hash_) == ORPHAN:
+            # Its parent is missing: we are behind the announcer, catch up from it
+            host, port = source.rsplit(":", 1)
+            self.sync_ledger_from(host, int(port))
+        return self.ledger.get_block(hash_) is not None
+
+    def publish_tx(self, xmif):
+        """Admit a new transaction to our mempool and gossip it to the network."""
+        tx = ParsedTx.from_xmif(xmif)
+        with self._mempool_lock:
+            if self.mempool.get_tx(tx.hash) is None:
+                self.mempool.store_tx(xmif)
+        self.gossip.publish("tx", tx.hash)
+        return tx.hash
+
+    def broadcast_block(self, block):
+        """Announce a block to every peer (a random subset of fanout_max_targets for large tables) instead of
+        the usual gossip fanout. Peers pull it in compact form, as for gossip. Appends it to our ledger first
+        if it is not there yet. Returns the round's {"targets", "ok", "failed", "timed_out", "elapsed"}."""
+        if self.ledger.get_block(block["hash"]) is None:
+            self.ledger.append_blocks([block])
+        self._evict_block_txs(block)
+        return self.gossip.broadcast("block", block["hash"], max_targets=CONFIG["fanout_max_targets"])
+
+    def _evict_block_txs(self, block):
+        # Transactions in a block are no longer pending: keep the miner from mining them again
+        hashes = [compactblock.tx_hash(tx) for tx in block.get("transactions", [])]
+        with self._mempool_lock:
+            self.mempool.remove(hashes)
+
+    def _on_block_accepted(self, block):
+        self._evict_block_txs(block)
+        self.gossip.publish("block", block["hash"])
+
+    def publish_block(self, block):
+        """Gossip a block, appending it to our ledger first if it is not there yet."""
+        if self.ledger.get_block(block["hash"]) is None:
+            self.ledger.append_blocks([block])
+        self._evict_block_txs(block)
+        self.gossip.publish("block", block["hash"])
+        return block["hash"]
+
+    def _register_gauges(self):
+        m = self.metrics
+        m.gauge("peers", "Known peers", lambda: self.peer_db.count())
+        m.gauge("ledger_height", "Blocks in the local ledger", lambda: self.ledger.height())
+        m.gauge("mempool_size", "Pending transactions in the mempool", lambda: len(self.mempool.mempool))
+        m.gauge("gossip_events_total", "Gossip inventory / pull counters",
+                lambda: {(k,): v for k, v in self.gossip.stats.items()}, labels=("event",), kind="counter")
+        m.gauge("ingest_blocks_total", "Block ingest counters",
+                lambda: {(k,): v for k, v in self.ingest.stats.items()}, labels=("event",), kind="counter")
+        m.gauge("fanout_calls_total", "Fan-out call results",
+                lambda: {(k,): v for k, v in self.fan_out.totals.items()}, labels=("result",), kind="counter")
+
+    def start_metrics(self, host=None, port=None):
+        port = CONFIG["metrics_port"] if port is None else port
+        if port is None:
+            return
+        try:
+            self.metrics_server = MetricsServer(self.metrics, host or CONFIG["metrics_host"], port).start()
+            print(f"Metrics on http://{host or CONFIG['metrics_host']}:{port}/metrics")
+        except OSError as e:
+            print(f"Metrics server not started: {e}")
+
     def start(self):
         # Start XML-RPC server
         self.start_server()
+        self.start_metrics()
 
         # Start roaming discovery thread
         roam_thread = threading.Thread(
             target=self.roam_discovery,
-            args=(CONFIG["roam_subnet_base"], CONFIG["roam_ports"], CONFIG["roam_interval_seconds"]),
+            args=(CONFIG["roam_subnet_base"], CONFIG["roam_ports"], CONFIG["roam_scan_interval_seconds"]),
             daemon=True,
         )
         roam_thread.start()
@@ -465,22 +1274,51 @@ class NodeManager:
         ann_thread.start()
         self.threads.append(ann_thread)
 
+        # Start DNS replication thread
+        dns_thread = threading.Thread(target=self.periodic_dns_sync, args=(CONFIG["dns_sync_interval_seconds"],), daemon=True)
+        dns_thread.start()
+        self.threads.append(dns_thread)
+
+        # Start IXAN registry replication thread
+        ixan_thread = threading.Thread(target=self.periodic_ixan_sync, args=(CONFIG["ixan_sync_interval_seconds"],), daemon=True)
+        ixan_thread.start()
+        self.threads.append(ixan_thread)
+
+        # Start ledger sync thread
+        ledger_thread = threading.Thread(target=self.periodic_ledger_sync, args=(CONFIG["ledger_sync_interval_seconds"],), daemon=True)
+        ledger_thread.start()
+        self.threads.append(ledger_thread)
+
     def stop(self):
         print("Stopping NodeManager...")
         self.stop_event.set()
         self.stop_server()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.gossip.close()
+        self.ingest.close()
+        self.fan_out.close()
+        self.rpc_pool.close()
+        self.peer_db.close()
         # Wait briefly for threads to finish
         time.sleep(0.5)
 
     # Convenience methods for local test/usage:
     def call_get_state(self, host, port):
+        """State xml of a peer. Fetched conditionally: an unchanged state is served from our copy."""
+        key = (host, int(port))
+        etag, xml = self.peer_states.get(key, ("-", None))
         try:
-            return rpc_call(host, port, "get_state", self.secret)
+            result = rpc_call(host, port, "get_state_if_changed", self.secret, payload=etag, pool=self.rpc_pool)
         except Exception as e:
             return None
+        if result.get("modified"):
+            xml = result["state"]
+            self.peer_states[key] = (result["etag"], xml)
+        return xml
 
     def call_send_state(self, host, port, xml_payload):
-        return rpc_call(host, port, "send_state", self.secret, payload=xml_payload)
+        return rpc_call(host, port, "send_state", self.secret, payload=xml_payload, pool=self.rpc_pool)
 
 
 # ----------------------------
@@ -0,0 +1,116 @@
+# Copyright (c) 2025 Nikola Tesla
+# Quote cache
+# Shared in-memory cache for exchange rates and price quotes (DEX, YellowCard, Uniswap)
+# - Every source has its own time-to-live
+# - Concurrent requests for the same quote wait on a single upstream call
+# - A quote that has just expired is still served while it is refreshed in the background, for a
+#   per-source grace period (short for the DEX, whose quotes price real swaps)
+# - invalidate() also discards refreshes already running, so they cannot write an old value back
+
+import time
+import threading
+
+# Seconds a quote stays fresh, per source
+DEFAULT_TTLS = {
+    'dex': 2.0,
+    'uniswap': 10.0,
+    'yellowcard': 30.0,
+}
+
+# Seconds past its TTL a quote may still be served while it is refreshed, per source
+DEFAULT_STALE_TTLS = {
+    'dex': 1.0,
+    'uniswap': 10.0,
+    'yellowcard': 30.0,
+}
+
+
+class _Pending:
+    # An upstream call in flight that other callers can wait on
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    def __init__(self, ttls=None, default_ttl=5.0, stale_ttls=None, default_stale_ttl=5.0):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.stale_ttls = dict(DEFAULT_STALE_TTLS)
+        if stale_ttls:
+            self.stale_ttls.update(stale_ttls)
+        self.default_stale_ttl = default_stale_ttl
+        self._entries = {} # (source, key) -> (value, fetched_at)
+        self._inflight = {} # (source, key) -> _Pending
+        self._generations = {} # (source, key) -> number of times it was invalidated
+        self._lock = threading.Lock()
+
+    def get(self, source, key, loader):
+        """
+        Return the cached quote for (source, key), calling loader() on a miss.
+        loader is only ever running once per (source, key) at a time.
+        """
+        cache_key = (source, key)
+        ttl = self.ttls.get(source, self.default_ttl)
+        stale_ttl = self.stale_ttls.get(source, self.default_stale_ttl)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                value, fetched_at = entry
+                age = time.monotonic() - fetched_at
+                if age < ttl:
+                    return value
+                if age < ttl + stale_ttl:
+                    # Stale but usable: answer now, refresh behind the caller
+                    if cache_key not in self._inflight:
+                        pending = self._inflight[cache_key] = _Pending()
+                        generation = self._generations.get(cache_key, 0)
+                        threading.Thread(target=self._load, args=(cache_key, loader, pending, generation),
+                                         daemon=True).start()
+                    return value
+            pending = self._inflight.get(cache_key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[cache_key] = _Pending()
+                generation = self._generations.get(cache_key, 0)
+
+        if leader:
+            self._load(cache_key, loader, pending, generation)
+        else:
+            pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.value
+
+    def _load(self, cache_key, loader, pending, generation):
+        try:
+            pending.value = loader()
+            with self._lock:
+                # Invalidated while loading: the value may predate the change, do not cache it
+                if self._generations.get(cache_key, 0) == generation:
+                    self._entries[cache_key] = (pending.value, time.monotonic())
+        except Exception as e:
+            pending.error = e
+        finally:
+            with self._lock:
+                if self._inflight.get(cache_key) is pending:
+                    del self._inflight[cache_key]
+            pending.event.set()
+
+    def invalidate(self, source=None, key=None):
+        # Drop one quote, every quote of a source, or everything.
+        # Loads already running for them are detached: later callers start a fresh one
+        with self._lock:
+            for cache_key in set(self._entries) | set(self._inflight):
+                if source is not None and (cache_key[0] != source or key is not None and cache_key[1] != key):
+                    continue
+                self._entries.pop(cache_key, None)
+                self._inflight.pop(cache_key, None)
+                self._generations[cache_key] = self._generations.get(cache_key, 0) + 1
+
+
+# Process-wide cache shared by the DEX and the external pricing services
+quote_cache = QuoteCache()
@@ -0,0 +1,111 @@
+# Copyright (c) 2025 Nikola Tesla
+# Savings sweeper
+# Accrues interest on locked savings positions and releases the ones whose lock has expired
+# Positions are loaded in chunks and the interest maths is done on whole NumPy arrays at once
+
+import time
+import sqlite3
+import threading
+import numpy as np
+
+YEAR_SECONDS = 365 * 86400
+
+
+def ensure_savings_schema(cursor):
+    # last_accrued was added after the savings table shipped, so older databases need the column
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(savings)").fetchall()]
+    if 'last_accrued' not in columns:
+        cursor.execute("ALTER TABLE savings ADD COLUMN last_accrued REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_savings_account ON savings(account_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_savings_locked ON savings(locked_until)")
+
+
+class SavingsSweeper:
+    def __init__(self, db_path='./db/account.db', chunk_size=50000):
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sweep(self, now=None):
+        """
+        Run one pass over every savings position.
+        Interest compounds at the position's yearly rate (APY) from last_accrued up to
+        now, or up to locked_until for positions that have matured. Matured positions
+        are credited back to the currency balance and removed from savings.
+        Returns a dict with the number of positions accrued, released and the interest paid.
+        """
+        now = time.time() if now is None else now
+        db = sqlite3.connect(self.db_path)
+        accrued = released = 0
+        interest_paid = 0.0
+        try:
+            cursor = db.cursor()
+            ensure_savings_schema(cursor)
+            last_rowid = 0
+            while True:
+                rows = cursor.execute(
+                    "SELECT rowid, currency, balance, interest_rate, locked_until, last_accrued FROM savings "
+                    "WHERE rowid > ? ORDER BY rowid LIMIT ?", (last_rowid, self.chunk_size)).fetchall()
+                if not rows:
+                    break
+                last_rowid = rows[-1][0]
+
+                rowids, currencies, balances, rates, locked, last = zip(*rows)
+                rowids = np.array(rowids, dtype=np.int64)
+                currencies = np.array(currencies, dtype=object)
+                balances = np.array(balances, dtype=np.float64)
+                rates = np.array(rates, dtype=np.float64)
+                locked = np.array(locked, dtype=np.float64)
+                # Positions written before last_accrued existed start accruing from this sweep
+                last = np.array([now if t is None else t for t in last], dtype=np.float64)
+
+                matured = locked <= now
+                accrue_until = np.minimum(locked, now)
+                elapsed = np.clip(accrue_until - last, 0.0, None)
+                new_balances = balances * np.power(1.0 + rates, elapsed / YEAR_SECONDS)
+                interest_paid += float((new_balances - balances).sum())
+
+                # Still locked: write the accrued balance back
+                keep = ~matured
+                cursor.executemany(
+                    "UPDATE savings SET balance = ?, last_accrued = ? WHERE rowid = ?",
+                    zip(new_balances[keep].tolist(), accrue_until[keep].tolist(), rowids[keep].tolist()))
+                accrued += int(keep.sum())
+
+                # Matured: one credit per currency, then drop the positions
+                if matured.any():
+                    symbols, groups = np.unique(currencies[matured].astype(str), return_inverse=True)
+                    totals = np.bincount(groups, weights=new_balances[matured])
+                    cursor.executemany(
+                        "UPDATE currency SET balance = balance + ? WHERE currency_symbol = ?",
+                        zip(totals.tolist(), symbols.tolist()))
+                    cursor.executemany(
+                        "DELETE FROM savings WHERE rowid = ?",
+                        ((r,) for r in rowids[matured].tolist()))
+                    released += int(matured.sum())
+                db.commit()
+        finally:
+            db.close()
+        return {'accrued': accrued, 'released': released, 'interest': interest_paid}
+
+    def run(self, interval_seconds):
+        while not self.stop_event.is_set():
+            try:
+                result = self.sweep()
+                print(f"Savings sweep: {result['accrued']} accrued, {result['released']} released.")
+            except Exception as e:
+                print(f"Savings sweep failed: {e}")
+            self.stop_event.wait(interval_seconds)
+
+    def start(self, interval_seconds=3600):
+        self.thread = threading.Thread(target=self.run, args=(interval_seconds,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    sweeper = SavingsSweeper()
+    print(sweeper.sweep())
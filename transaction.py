@@ -3,10 +3,12 @@ import os
 import sys
 import datetime
 import random
-from account import Account
+from account import keyring, verify_signature, SIG_DIGEST
 from accountmanager import AccountManager
-from xdns import DNS
+from xdns import get_resolver
 from mempool import Mempool
+from ixan import is_ixan
+from microformat import encode_mc
 import json
 
 def serialize(amount, currency, owner):
@@ -18,13 +20,19 @@ def serialize(amount, currency, owner):
 
         
 class Transaction:
-    def __init__(self, passphrase, receiver, amount, fees, currency, sender_account_name="default"):
-        self.sender = Account(passphrase, account_name=sender_account_name)
+    def __init__(self, passphrase, receiver, amount, fees, currency, sender_account_name="default",
+                 manager=None, default_currency=None, resolved=False):
+        # manager, default_currency and resolved let TransactionBatch share one
+        # AccountManager and one DNS lookup between many transactions
+        self.sender = keyring.get(passphrase, account_name=sender_account_name)
         
         # Resolve receiver using DNS if it doesn't look like a raw key/address (e.g., simplistic check)
         # Assuming "long" strings are keys. Short ones names.
-        if len(receiver) < 50:
-             dns = DNS()
+        # IXANs are already account numbers and are routed as they are.
+        if resolved or is_ixan(receiver):
+            self.receiver = receiver
+        elif len(receiver) < 50:
+             dns = get_resolver()
              resolved = dns.resolve(receiver)
              if resolved:
                  self.receiver = resolved
@@ -38,19 +46,23 @@ class Transaction:
         self.time = datetime.datetime.now().strftime('%d/%m/%Y, %H:%M:%S')
         self.fees = fees # Normally, just a titbit is paid as fees by incentive for the miner
         self.currency = currency # receiver's currency
-        self.manager = AccountManager(passphrase)
+        self.manager = manager if manager is not None else AccountManager(passphrase)
+        self.default_currency = default_currency if default_currency is not None else self.manager.get_default()
+        self.sig_version = SIG_DIGEST
         self.signature = self.sign();
         # Account management class
 
     def sign(self):
         # Signs the transaction using the sender's private key
+        if self.sig_version == SIG_DIGEST:
+            return self.sender.sign_digest(self.get_microformat())
         signature = self.sender.sign(self.get_microformat());
         return signature
 
     def validate(self):
         # Validates the transaction especially if the transaction inputs do not pass the balance of the user, as well as if the user truely signed the transaction
         txmsg = self.get_microformat()
-        if self.sender.verify(txmsg, self.signature) == False:
+        if verify_signature(self.sender.public_key, txmsg, self.signature, self.sig_version) == False:
             return False
         # We will also check if the receiver is a valid xbucks user
         else:
@@ -59,8 +71,7 @@ class Transaction:
     def generate_money_format(self):
         # Generate an XBucks Spendable Token
         # Useful for cross - currency transfer
-        default_currency = self.manager.get_default() # I will have to know my currency
-        money = serialize(self.amount, default_currency, self.sender.ixan())
+        money = serialize(self.amount, self.default_currency, self.sender.ixan()) # I will have to know my currency
         return money
         
     def get_microformat(self):
@@ -68,6 +79,10 @@ class Transaction:
         mc_format = '|'.join([self.sender.ixan(), self.receiver, json.dumps(self.generate_money_format()), self.time, str(self.fees)])
         return mc_format;
 
+    def get_binary_format(self):
+        # Compact bytes of the microformat (see microformat.py)
+        return encode_mc(self.get_microformat())
+
     def get_xmif_format(self):
         """
         Generate an XBucks Money Interchange Format
@@ -75,9 +90,10 @@ class Transaction:
         """
         xmif = {}
         mc = self.get_microformat()
-        sign = self.sign()
+        sign = self.signature # Signed once, in __init__
         xmif['mc'] = mc
         xmif['signature'] = sign
+        xmif['sig_version'] = self.sig_version
         return dict(xmif)
 
     def submit(self):
@@ -90,3 +106,35 @@ class Transaction:
         print(f"Transaction submitted to Mempool: {xmif}")
 
 
+class TransactionBatch:
+    """
+    Build and submit many transactions from one sender.
+    The sender's keys, AccountManager and default currency are loaded once,
+    every receiver name is resolved in a single DNS query, each transaction is
+    signed once and the whole batch is appended to the Mempool in one write.
+    """
+    def __init__(self, passphrase, sender_account_name="default"):
+        self.passphrase = passphrase
+        self.sender_account_name = sender_account_name
+        self.entries = []
+
+    def add(self, receiver, amount, fees, currency):
+        self.entries.append((receiver, amount, fees, currency))
+        return self
+
+    def build(self):
+        manager = AccountManager(self.passphrase)
+        default_currency = manager.get_default()
+        # Same rule as Transaction: short non-IXAN receivers are DNS names
+        names = {r for r, _, _, _ in self.entries if not is_ixan(r) and len(r) < 50}
+        addresses = get_resolver().resolve_many(names) if names else {}
+        return [Transaction(self.passphrase, addresses.get(receiver, receiver), amount, fees, currency,
+                            sender_account_name=self.sender_account_name, manager=manager,
+                            default_currency=default_currency, resolved=True)
+                for receiver, amount, fees, currency in self.entries]
+
+    def submit(self):
+        txs = self.build()
+        Mempool().store_many([tx.get_xmif_format() for tx in txs])
+        print(f"Submitted {len(txs)} transactions to Mempool.")
+        return txs
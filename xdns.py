@@ -1,16 +1,32 @@
 
 import sqlite3
 import os
+import time
+import threading
+from collections import OrderedDict
 
 class DNS:
-    def __init__(self):
-        self.db_path = './db/dns.db'
+    # Database files whose schema has already been created by this process
+    _initialized = set()
+
+    def __init__(self, db_path='./db/dns.db', cache_size=4096, negative_ttl=30.0):
+        self.db_path = db_path
+        self.cache_size = cache_size # Bound on cached names (positive and negative each)
+        self.negative_ttl = negative_ttl # Seconds a "not found" answer is remembered
+        self._cache = OrderedDict() # name -> address, least recently used first
+        self._negative = OrderedDict() # name -> expiry time
+        self._lock = threading.Lock()
         self._init_db()
+        # One connection for the lifetime of the resolver
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
 
     def _init_db(self):
-        if not os.path.exists('./db'):
-            os.makedirs('./db')
-        
+        if self.db_path in DNS._initialized:
+            return
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
         conn = sqlite3.connect(self.db_path)
         try:
             cursor = conn.cursor()
@@ -20,34 +36,174 @@ class DNS:
                     address TEXT NOT NULL
                 )
             """)
+            # Replication: every write gets the next local version, and updated_at is
+            # the time of the original registration (used to pick a winner between nodes)
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(records)").fetchall()]
+            if 'version' not in columns:
+                cursor.execute("ALTER TABLE records ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            if 'updated_at' not in columns:
+                cursor.execute("ALTER TABLE records ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_version ON records(version)")
+            # Records written before versioning (or by an older build) sit at version 0, which no
+            # cursor ever asks past: give each a distinct version above the current ones so they replicate
+            cursor.execute("UPDATE records SET version = rowid + (SELECT COALESCE(MAX(version), 0) FROM records) "
+                           "WHERE version = 0")
+            cursor.execute("UPDATE records SET updated_at = ? WHERE updated_at = 0", (time.time(),))
+            # How far we have pulled from each peer, in that peer's version numbers
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_cursors (
+                    peer TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
             conn.commit()
         finally:
             conn.close()
+        DNS._initialized.add(self.db_path)
 
     def register_address(self, name, address):
-        conn = sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR REPLACE INTO records (name, address) VALUES (?, ?)", (name, address))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"DNS Registration Failed: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute("INSERT OR REPLACE INTO records (name, address, version, updated_at) VALUES (?, ?, ?, ?)",
+                               (name, address, self._next_version(cursor), time.time()))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                print(f"DNS Registration Failed: {e}")
+                return False
+            finally:
+                # Whatever we had cached for this name is no longer right
+                self._cache.pop(name, None)
+                self._negative.pop(name, None)
+
+    def _next_version(self, cursor):
+        # Caller holds the lock
+        return cursor.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM records").fetchone()[0]
+
+    # --- Replication ---
+    def get_version(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM records").fetchone()[0]
+
+    def changes_since(self, version, limit=500):
+        """
+        Records written after `version`, oldest first, at most `limit` of them.
+        Returns a list of (name, address, updated_at, version).
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT name, address, updated_at, version FROM records WHERE version > ? ORDER BY version LIMIT ?",
+                           (int(version), int(limit)))
+            return cursor.fetchall()
+
+    def apply_records(self, records):
+        """
+        Merge (name, address, updated_at, ...) records pulled from a peer.
+        The newest registration wins (ties broken on the address so every node picks
+        the same one). Accepted records get a fresh local version so they are passed
+        on to our own peers. Returns the number of records accepted.
+        """
+        applied = 0
+        with self._lock:
+            cursor = self.conn.cursor()
+            for name, address, updated_at, *_ in records:
+                local = cursor.execute("SELECT address, updated_at FROM records WHERE name = ?", (name,)).fetchone()
+                if local is not None and (local[1], local[0]) >= (updated_at, address):
+                    continue
+                cursor.execute("INSERT OR REPLACE INTO records (name, address, version, updated_at) VALUES (?, ?, ?, ?)",
+                               (name, address, self._next_version(cursor), updated_at))
+                self._cache.pop(name, None)
+                self._negative.pop(name, None)
+                applied += 1
+            self.conn.commit()
+        return applied
+
+    def get_sync_cursor(self, peer):
+        with self._lock:
+            row = self.conn.execute("SELECT version FROM sync_cursors WHERE peer = ?", (peer,)).fetchone()
+            return row[0] if row else 0
+
+    def set_sync_cursor(self, peer, version):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_cursors (peer, version) VALUES (?, ?)", (peer, int(version)))
+            self.conn.commit()
+
+    def _cached(self, name, now):
+        # Returns (hit, address); caller holds the lock
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return True, self._cache[name]
+        expires = self._negative.get(name)
+        if expires is not None:
+            if expires > now:
+                return True, None
+            del self._negative[name]
+        return False, None
+
+    def _remember(self, name, address, now):
+        # Caller holds the lock
+        if address is None:
+            self._negative[name] = now + self.negative_ttl
+            if len(self._negative) > self.cache_size:
+                self._negative.popitem(last=False)
+        else:
+            self._cache[name] = address
+            self._cache.move_to_end(name)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
 
     def resolve(self, name):
-        conn = sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.cursor()
+        now = time.monotonic()
+        with self._lock:
+            hit, address = self._cached(name, now)
+            if hit:
+                return address
+            cursor = self.conn.cursor()
             cursor.execute("SELECT address FROM records WHERE name = ?", (name,))
             result = cursor.fetchone()
-            if result:
-                return result[0]
-            return None
-        finally:
-            conn.close()
+            address = result[0] if result else None
+            self._remember(name, address, now)
+            return address
+
+    def resolve_many(self, names):
+        # Resolve several names with one query; returns {name: address} for the names found
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            missing = []
+            for name in set(names):
+                hit, address = self._cached(name, now)
+                if not hit:
+                    missing.append(name)
+                elif address is not None:
+                    found[name] = address
+            cursor = self.conn.cursor()
+            # Stay under SQLite's bound parameter limit
+            for i in range(0, len(missing), 900):
+                chunk = missing[i:i + 900]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"SELECT name, address FROM records WHERE name IN ({placeholders})", chunk)
+                rows = dict(cursor.fetchall())
+                for name in chunk:
+                    self._remember(name, rows.get(name), now)
+                found.update(rows)
+            return found
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+def get_resolver(db_path='./db/dns.db'):
+    # Shared resolver per database file, so its connection and cache are reused
+    with _resolvers_lock:
+        if db_path not in _resolvers:
+            _resolvers[db_path] = DNS(db_path)
+        return _resolvers[db_path]
 
 if __name__ == "__main__":
     dns = DNS()